@@ -0,0 +1,189 @@
+"""
+Measures packet loss, CRC failures and decode cost of the IR protocol for
+games of 2 to 50 players sharing one simulated IR channel.
+
+    python3 host/bench_ir_players.py --players 2 10 50 --seconds 30
+"""
+
+import argparse
+import contextlib
+import random
+import time
+
+from ir_medium import NullOutput, SharedMedium, SimClock, install_clock, infrared
+
+SPELL_EVENT = 1
+
+
+def run(
+    players,
+    seconds,
+    shot_interval,
+    protocol,
+    step_ms,
+    arena,
+    jitter_us,
+    dropout,
+    unit=infrared.IR_UNIT,
+    slot_count=0,
+    fec=False,
+):
+    clock = SimClock()
+    install_clock(clock)
+    medium = SharedMedium(clock, jitter_us=jitter_us, edge_dropout=dropout)
+    for i in range(players):
+        position = (random.uniform(0, arena), random.uniform(0, arena))
+        endpoint = medium.add_endpoint(position, protocol, unit=unit, fec=fec)
+        if slot_count > 0:
+            # two teams taking turns, with fewer slots than players the
+            # devices of a team share them
+            players_per_team = (slot_count + 1) // 2
+            slot = infrared.ir_slot(i % 2, i // 2 % players_per_team, players_per_team)
+            endpoint.infrared.use_slots(slot, players_per_team * 2)
+
+    step_us = int(step_ms * 1000)
+    shot_chance = step_ms / 1000 / shot_interval
+    sent_payloads = set()
+    sequence = 0
+    offered = 0
+    delivered = 0
+    corrupt = 0
+    decoded_pulses = 0
+    decode_seconds = 0
+
+    with contextlib.redirect_stdout(NullOutput()):
+        while clock.now_us < seconds * 1000000:
+            clock.now_us += step_us
+            now_us = clock.now_us
+            medium.advance()
+            for endpoint in medium.endpoints:
+                if clock.now_us < endpoint.busy_until_us:
+                    continue
+
+                if random.random() < shot_chance:
+                    sequence += 1
+                    payload = bytes(
+                        (
+                            SPELL_EVENT,
+                            endpoint.endpoint_id,
+                            (sequence >> 8) & 0xFF,
+                            sequence & 0xFF,
+                        )
+                    )
+                    sent_payloads.add(payload)
+                    offered += 1
+                    endpoint.infrared.send(payload)
+                endpoint.infrared.tick()
+                clock.now_us = now_us
+
+                decoded_pulses += len(endpoint.pulsein)
+                start = time.perf_counter()
+                packets = endpoint.infrared.receive_all()
+                decode_seconds += time.perf_counter() - start
+                for packet in packets:
+                    if bytes(packet.data) in sent_payloads:
+                        delivered += 1
+                    else:
+                        corrupt += 1
+
+    transmitted = len(medium.transmissions)
+    stats = [endpoint.infrared.snapshot() for endpoint in medium.endpoints]
+    crc_failures = sum(endpoint_stats["crc_failures"] for endpoint_stats in stats)
+    expected = sum(receivers for sender, receivers in medium.transmissions)
+    return {
+        "players": players,
+        "offered": offered,
+        "transmitted": transmitted,
+        "expected": expected,
+        "delivered": delivered,
+        "delivered_per_second": delivered / seconds,
+        "loss": 1 - delivered / expected if expected else 0,
+        "crc_failure": crc_failures / expected if expected else 0,
+        "corrupt": corrupt,
+        "corrected_bits": sum(
+            endpoint_stats["corrected_bits"] for endpoint_stats in stats
+        ),
+        "decode_us_per_pulse": (
+            decode_seconds * 1000000 / decoded_pulses if decoded_pulses else 0
+        ),
+        "overflows": sum(endpoint.pulsein.overflows for endpoint in medium.endpoints),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--players", type=int, nargs="+", default=[2, 5, 10, 20, 35, 50]
+    )
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument(
+        "--shot-interval",
+        type=float,
+        default=2.0,
+        help="mean seconds between shots per player",
+    )
+    parser.add_argument(
+        "--protocol", type=int, default=infrared.IR_PROTOCOL_V1, choices=(1, 2)
+    )
+    parser.add_argument(
+        "--unit",
+        type=int,
+        default=infrared.IR_UNIT,
+        help="transmit unit in microseconds",
+    )
+    parser.add_argument("--fec", action="store_true", help="send Hamming coded frames")
+    parser.add_argument(
+        "--step-ms", type=float, default=5, help="main loop period of every device"
+    )
+    parser.add_argument(
+        "--arena", type=float, default=8, help="side of the square play area in metres"
+    )
+    parser.add_argument("--jitter-us", type=float, default=30)
+    parser.add_argument(
+        "--dropout",
+        type=float,
+        default=0.0005,
+        help="chance a mark is missed at close range",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        "{:>7} {:>8} {:>8} {:>9} {:>9} {:>7} {:>8} {:>8} {:>9} {:>10} {:>9}".format(
+            "players",
+            "offered",
+            "sent",
+            "expected",
+            "delivered",
+            "loss",
+            "crc fail",
+            "corrupt",
+            "corrected",
+            "us/pulse",
+            "overflows",
+        )
+    )
+    for players in args.players:
+        random.seed(args.seed)
+        result = run(
+            players,
+            args.seconds,
+            args.shot_interval,
+            args.protocol,
+            args.step_ms,
+            args.arena,
+            args.jitter_us,
+            args.dropout,
+            args.unit,
+            fec=args.fec,
+        )
+        print(
+            "{players:>7} {offered:>8} {transmitted:>8} {expected:>9} {delivered:>9} {loss:>7.1%} "
+            "{crc_failure:>8.1%} {corrupt:>8} {corrected_bits:>9} {decode_us_per_pulse:>10.2f} {overflows:>9}".format(
+                **result
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
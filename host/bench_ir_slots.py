@@ -0,0 +1,79 @@
+"""
+Compares delivered packets per second with and without the time-slotted
+transmit mode, for 8, 16 and 32 senders on one simulated IR channel.
+
+    python3 host/bench_ir_slots.py --players 8 16 32 --seconds 60
+"""
+
+import argparse
+import random
+
+from bench_ir_players import run
+from ir_medium import infrared
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--players", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument(
+        "--shot-interval",
+        type=float,
+        default=2.0,
+        help="mean seconds between shots per player",
+    )
+    parser.add_argument(
+        "--protocol", type=int, default=infrared.IR_PROTOCOL_V1, choices=(1, 2)
+    )
+    parser.add_argument(
+        "--unit",
+        type=int,
+        default=infrared.IR_UNIT,
+        help="transmit unit in microseconds",
+    )
+    parser.add_argument(
+        "--slot-count",
+        type=int,
+        default=None,
+        help="slots per cycle, one per player by default",
+    )
+    parser.add_argument(
+        "--step-ms", type=float, default=5, help="main loop period of every device"
+    )
+    parser.add_argument(
+        "--arena", type=float, default=8, help="side of the square play area in metres"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        "{:>7} {:>8} {:>8} {:>8} {:>9} {:>7} {:>12}".format(
+            "players", "mode", "offered", "sent", "delivered", "loss", "delivered/s"
+        )
+    )
+    for players in args.players:
+        slot_count = args.slot_count or players
+        for mode, slots in (("free", 0), ("slotted", slot_count)):
+            random.seed(args.seed)
+            result = run(
+                players,
+                args.seconds,
+                args.shot_interval,
+                args.protocol,
+                args.step_ms,
+                args.arena,
+                jitter_us=30,
+                dropout=0.0005,
+                unit=args.unit,
+                slot_count=slots,
+            )
+            print(
+                "{players:>7} {mode:>8} {offered:>8} {transmitted:>8} {delivered:>9} {loss:>7.1%} "
+                "{delivered_per_second:>12.1f}".format(mode=mode, **result)
+            )
+
+
+if __name__ == "__main__":
+    main()
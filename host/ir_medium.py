@@ -0,0 +1,215 @@
+"""
+Host-side simulation of many Infrared endpoints sharing one IR channel.
+
+Each endpoint gets a fake PulseIn and PulseOut wired to a SharedMedium. A
+transmission becomes a list of mark intervals. Every receiver in range sees
+its own copy with per-edge timing jitter and distance-dependent dropouts.
+Overlapping transmissions are merged the way a real receiver would see
+them, which produces garbled pulse trains. Run from the repository root
+with python3, the shared modules are imported from ../shared.
+"""
+
+import math
+import os
+import random
+import sys
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared")
+)
+
+import infrared  # noqa: E402
+
+# longest duration PulseIn can report
+MAX_PULSE = 0xFFFF
+
+
+class SimClock(object):
+    # Stands in for the time module inside infrared.py so tick() and the
+    # backoff run on simulated time.
+    def __init__(self):
+        self.now_us = 0
+
+    def monotonic(self):
+        return self.now_us / 1000000
+
+    def sleep(self, seconds):
+        self.now_us += int(seconds * 1000000)
+
+
+class FakePulseIn(object):
+    def __init__(self, maxlen=infrared.IR_RECEIVE_BUFFER):
+        self.maxlen = maxlen
+        self._pulses = []
+        self._start = 0
+        self._paused = False
+        self.overflows = 0
+
+    def _record(self, duration):
+        if self._paused:
+            return
+        if len(self) == self.maxlen:
+            # PulseIn overwrites the oldest pulse when it is full
+            self._start += 1
+            self.overflows += 1
+        self._pulses.append(min(duration, MAX_PULSE))
+
+    def __len__(self):
+        return len(self._pulses) - self._start
+
+    def __getitem__(self, index):
+        return self._pulses[self._start + index]
+
+    def popleft(self):
+        if len(self) == 0:
+            raise IndexError("pop from empty PulseIn")
+        pulse = self._pulses[self._start]
+        self._start += 1
+        if self._start > 1024:
+            del self._pulses[: self._start]
+            self._start = 0
+        return pulse
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self, trigger_duration=0):
+        self._paused = False
+
+    def clear(self):
+        self._pulses = []
+        self._start = 0
+
+
+class FakePulseOut(object):
+    def __init__(self, medium, endpoint):
+        self._medium = medium
+        self._endpoint = endpoint
+
+    def send(self, durations):
+        self._medium.transmit(self._endpoint, durations)
+        # PulseOut.send only returns once the frame is out, the caller puts
+        # the clock back for the other endpoints
+        self._medium.clock.now_us = self._endpoint.busy_until_us
+
+
+class Endpoint(object):
+    def __init__(self, medium, endpoint_id, position, protocol, maxlen, unit, fec):
+        self.endpoint_id = endpoint_id
+        self.position = position
+        self.pulsein = FakePulseIn(maxlen)
+        self.pulseout = FakePulseOut(medium, self)
+        self.infrared = infrared.Infrared(
+            self.pulseout, self.pulsein, protocol, unit, fec
+        )
+        # a real PulseOut.send blocks the main loop until the frame is sent
+        self.busy_until_us = 0
+
+        # receiver state, mark intervals that have not been turned into pulses
+        self._marks = []
+        self._last_edge_us = None
+
+
+class SharedMedium(object):
+    def __init__(
+        self,
+        clock,
+        jitter_us=30,
+        edge_dropout=0.0005,
+        ir_range=10.0,
+    ):
+        self.clock = clock
+        self.jitter_us = jitter_us
+        self.edge_dropout = edge_dropout
+        self.ir_range = ir_range
+        self.endpoints = []
+        # (sender id, receivers in range) for every frame sent
+        self.transmissions = []
+
+    def add_endpoint(
+        self,
+        position,
+        protocol=infrared.IR_PROTOCOL_V1,
+        maxlen=256,
+        unit=infrared.IR_UNIT,
+        fec=False,
+    ):
+        endpoint = Endpoint(
+            self, len(self.endpoints), position, protocol, maxlen, unit, fec
+        )
+        self.endpoints.append(endpoint)
+        return endpoint
+
+    def distance(self, a, b):
+        return math.hypot(a.position[0] - b.position[0], a.position[1] - b.position[1])
+
+    def transmit(self, sender, durations):
+        start = self.clock.now_us
+        marks = []
+        time_us = start
+        for index, duration in enumerate(durations):
+            if index % 2 == 0:
+                marks.append((time_us, time_us + duration))
+            time_us += duration
+        sender.busy_until_us = time_us
+
+        receivers = 0
+        for receiver in self.endpoints:
+            if receiver is sender:
+                continue
+            distance = self.distance(sender, receiver)
+            if distance > self.ir_range:
+                continue
+            receivers += 1
+            # weaker signal further away, so more marks go missing
+            dropout = self.edge_dropout * (1 + 4 * (distance / self.ir_range) ** 2)
+            # light travels about 300 metres per microsecond
+            delay = distance / 300
+            for mark_start, mark_end in marks:
+                if random.random() < dropout:
+                    continue
+                jittered_start = mark_start + delay + random.gauss(0, self.jitter_us)
+                jittered_end = mark_end + delay + random.gauss(0, self.jitter_us)
+                if jittered_end > jittered_start:
+                    receiver._marks.append((jittered_start, jittered_end))
+            receiver._marks.sort()
+
+        self.transmissions.append((sender.endpoint_id, receivers))
+
+    def advance(self):
+        # turns every mark that has fully ended into PulseIn durations
+        now = self.clock.now_us
+        for receiver in self.endpoints:
+            marks = receiver._marks
+            while marks and marks[0][0] <= now:
+                mark_start, mark_end = marks[0]
+                merged = 1
+                # overlapping transmissions look like one long mark
+                while merged < len(marks) and marks[merged][0] <= mark_end:
+                    mark_end = max(mark_end, marks[merged][1])
+                    merged += 1
+                if mark_end > now:
+                    break
+                del marks[:merged]
+                last_edge = receiver._last_edge_us
+                if last_edge is not None:
+                    # a mark jittered into one already reported only extends it
+                    mark_start = max(mark_start, last_edge + 1)
+                    if mark_end <= mark_start:
+                        continue
+                    receiver.pulsein._record(int(mark_start - last_edge))
+                receiver.pulsein._record(int(mark_end - mark_start))
+                receiver._last_edge_us = mark_end
+
+
+class NullOutput(object):
+    # stdout replacement that swallows the device logging
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def install_clock(clock):
+    infrared.time = clock
@@ -0,0 +1,369 @@
+"""
+Offline IR decoder for long captures. Decodes a numpy array of pulse
+durations with the same rules as IRDecoder in shared/infrared.py, but works
+on every header at once instead of pulse by pulse. FEC frames are skipped.
+Run it to check it against IRDecoder and to measure its speed, or on capture
+files written by infrared_capture.CaptureRecorder:
+
+    python3 host/ir_vector_decoder.py
+    python3 host/ir_vector_decoder.py game.qirc
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared")
+)
+
+import infrared  # noqa: E402
+from infrared_capture import CaptureReplay  # noqa: E402
+
+# longest duration PulseIn can report
+MAX_PULSE = 0xFFFF
+# the symbol tables padded with invalid entries so every scaled pulse has
+# one, V1 first and then V2
+_TABLE_LENGTH = (
+    MAX_PULSE
+    * infrared.IR_UNIT
+    // infrared._MIN_RECEIVED_UNIT
+    // infrared.IR_SYMBOL_QUANTUM
+    + 1
+)
+_SYMBOL_TABLES = np.full(2 * _TABLE_LENGTH, infrared.IR_SYMBOL_INVALID, dtype=np.uint8)
+_SYMBOL_TABLES[: infrared._SYMBOL_TABLE_LENGTH] = np.frombuffer(
+    bytes(infrared._SYMBOL_TABLE), dtype=np.uint8
+)
+_SYMBOL_TABLES[_TABLE_LENGTH : _TABLE_LENGTH + infrared._SYMBOL_TABLE_LENGTH] = (
+    np.frombuffer(bytes(infrared._V2_SYMBOL_TABLE), dtype=np.uint8)
+)
+_CRC_TABLE = np.frombuffer(bytes(infrared._CRC_TABLE), dtype=np.uint8)
+_DURATIONS = np.array(infrared._SYMBOL_DURATIONS, dtype=np.int32)
+_LEVEL_0 = infrared.IR_SYMBOL_LEVEL_0
+
+_IS_DATA = np.zeros(256, dtype=bool)
+_IS_DATA[[infrared.IR_SYMBOL_ZERO, infrared.IR_SYMBOL_ONE]] = True
+_IS_DATA[_LEVEL_0 : _LEVEL_0 + 4] = True
+_IS_LEAD_OUT = np.zeros(256, dtype=bool)
+_IS_LEAD_OUT[[infrared.IR_SYMBOL_LEAD_OUT, infrared.IR_SYMBOL_V2_LEAD_OUT]] = True
+# the bits each V2 level carries, high bit first
+_LEVEL_BITS = np.zeros((256, 2), dtype=np.uint8)
+for _level in range(4):
+    _LEVEL_BITS[_LEVEL_0 + _level] = (_level >> 1, _level & 1)
+
+# payload plus CRC byte, the largest packet IRDecoder accepts
+MAX_BYTES = infrared.IR_MAX_PAYLOAD + 1
+# data pulses of the longest V1 frame, up to 7 unused bits, and the lead out
+MAX_SYMBOLS = MAX_BYTES * 8 + 8
+# columns classified per step, most false headers end within the first
+# few pulses and real frames are 20 to 70 pulses long
+SYMBOL_BLOCKS = (0, 4, 12, 28, 60, 100, MAX_SYMBOLS)
+# headers decoded per batch, bounds the memory used by the frame matrices
+BATCH = 65536
+
+
+def find_headers(pulses):
+    # every position whose pulse and the next one pass the header checks of
+    # IRDecoder._calibrate, with their protocol and calibrated unit
+    marks = pulses[:-1]
+    positions = np.nonzero(
+        (marks >= infrared._MIN_HEADER_MARK) & (marks <= infrared._MAX_HEADER_MARK)
+    )[0]
+    mark = pulses[positions]
+    space = pulses[positions + 1]
+    space8 = space * 8
+    v1 = (mark * 5 <= space8) & (space8 <= mark * 7)
+    v2 = (mark * 3 <= space8) & (space8 < mark * 5)
+    unit = (mark + space) // np.where(v1, 8 + 6, 8 + 4).astype(np.int32)
+    # headers within the error margin of IR_UNIT are taken at it
+    nominal_space = np.where(v1, infrared.IR_HEADER_SPACE, infrared.IR_V2_HEADER_SPACE)
+    nominal = (np.abs(mark - infrared.IR_HEADER_MARK) <= infrared.IR_ERROR_MARGIN) & (
+        np.abs(space - nominal_space) <= infrared.IR_ERROR_MARGIN
+    )
+    unit = np.where(nominal, infrared.IR_UNIT, unit).astype(np.int32)
+    found = (
+        (v1 | v2)
+        & (unit >= infrared._MIN_RECEIVED_UNIT)
+        & (unit <= infrared._MAX_RECEIVED_UNIT)
+    )
+    return positions[found], v2[found], unit[found]
+
+
+def _frame_pulses(pulses, positions, columns):
+    return pulses[positions[:, None] + (columns + 2)[None, :]]
+
+
+def _classify(frame_pulses, is_v2, unit):
+    # one division instead of scaling to IR_UNIT and then to the quantum,
+    # the floor of both steps is the same
+    index = (
+        frame_pulses * infrared.IR_UNIT // (unit * infrared.IR_SYMBOL_QUANTUM)[:, None]
+    )
+    index += is_v2[:, None] * _TABLE_LENGTH
+    return _SYMBOL_TABLES[index]
+
+
+def _scan_frames(pulses, positions, is_v2, unit):
+    # classifies the pulses after each header a block at a time, headers
+    # drop out at their first pulse that isn't data. Returns the symbols
+    # and the column of that pulse (MAX_SYMBOLS when there is none).
+    count = len(positions)
+    symbols = np.zeros((count, MAX_SYMBOLS), dtype=np.uint8)
+    ends = np.full(count, MAX_SYMBOLS)
+    alive = np.arange(count)
+    for start, stop in zip(SYMBOL_BLOCKS, SYMBOL_BLOCKS[1:]):
+        columns = np.arange(start, stop)
+        block = _classify(
+            _frame_pulses(pulses, positions[alive], columns), is_v2[alive], unit[alive]
+        )
+        symbols[alive, start:stop] = block
+
+        not_data = ~_IS_DATA[block]
+        ended = not_data.any(axis=1)
+        ends[alive[ended]] = start + not_data[ended].argmax(axis=1)
+        alive = alive[~ended]
+        if len(alive) == 0:
+            break
+    return symbols, ends
+
+
+def _strengths(pulses, positions, unit, symbols, ends):
+    # worst error of the header mark and every pulse up to the lead out,
+    # only worked out for the frames that decoded
+    margins = np.abs(
+        pulses[positions] * infrared.IR_UNIT // unit - infrared.IR_HEADER_MARK
+    )
+    columns = np.arange(symbols.shape[1])
+    scaled = (
+        _frame_pulses(pulses, positions, columns) * infrared.IR_UNIT // unit[:, None]
+    )
+    margin = np.abs(scaled - _DURATIONS[symbols])
+    margin[columns[None, :] > ends[:, None]] = 0
+    margins = np.maximum(margins, margin.max(axis=1))
+    return np.clip(
+        1.3 - margins / infrared.IR_ERROR_MARGIN, infrared.IR_MIN_STRENGTH, 1
+    )
+
+
+def _decode_frames(pulses, positions, is_v2, unit):
+    # returns the rows that decode to a packet with a good CRC, with the
+    # column of their lead out, payload matrix, payload length and strength
+    symbols, ends = _scan_frames(pulses, positions, is_v2, unit)
+    ended = np.nonzero(ends < MAX_SYMBOLS)[0]
+    lead_out = ended[_IS_LEAD_OUT[symbols[ended, ends[ended]]]]
+    # unfinished bytes at the lead out are dropped like in _write_bits
+    lengths = np.where(is_v2[lead_out], ends[lead_out] * 2, ends[lead_out]) // 8
+    rows = lead_out[(lengths > 0) & (lengths <= MAX_BYTES)]
+    if len(rows) == 0:
+        return rows, rows, np.zeros((0, MAX_BYTES), dtype=np.uint8), rows, np.zeros(0)
+
+    ends = ends[rows]
+    width = int(ends.max())
+    # with the lead out, for the strengths
+    frame_symbols = symbols[rows, : width + 1]
+    symbols = frame_symbols[:, :width]
+    is_v2 = is_v2[rows]
+    used = np.arange(width)[None, :] < ends[:, None]
+    data = np.zeros((len(rows), MAX_BYTES + 1), dtype=np.uint8)
+    v1 = ~is_v2
+    v1_bytes = np.packbits((symbols[v1] == infrared.IR_SYMBOL_ONE) & used[v1], axis=1)
+    data[v1, : v1_bytes.shape[1]] = v1_bytes[:, : MAX_BYTES + 1]
+    v2_bits = _LEVEL_BITS[symbols[is_v2] * used[is_v2]].reshape(-1, width * 2)
+    v2_bytes = np.packbits(v2_bits, axis=1)
+    data[is_v2, : v2_bytes.shape[1]] = v2_bytes[:, : MAX_BYTES + 1]
+
+    # CRC of all bytes before the last one, which has to match it
+    lengths = np.where(is_v2, ends * 2, ends) // 8
+    crc = np.zeros(len(rows), dtype=np.uint8)
+    data_crc = np.zeros(len(rows), dtype=np.uint8)
+    for column in range(int(lengths.max()) - 1):
+        crc = _CRC_TABLE[crc ^ data[:, column]]
+        data_crc = np.where(column < lengths - 1, crc, data_crc)
+    good = data[np.arange(len(rows)), lengths - 1] == data_crc
+
+    rows = rows[good]
+    strengths = _strengths(
+        pulses, positions[rows], unit[rows], frame_symbols[good], ends[good]
+    )
+    return rows, ends[good], data[good, :MAX_BYTES], lengths[good] - 1, strengths
+
+
+def decode_arrays(pulses, overlapping=False):
+    # returns the positions, payload matrix, payload lengths and strengths
+    # of every frame IRDecoder would return, in order. With overlapping,
+    # frames that start before the previous one ended are returned too.
+    # zeros after the capture are invalid pulses that end the last frame
+    pulses = np.concatenate(
+        (
+            np.minimum(np.asarray(pulses), MAX_PULSE).astype(np.int32),
+            np.zeros(MAX_SYMBOLS + 2, dtype=np.int32),
+        )
+    )
+    positions, is_v2, unit = find_headers(pulses)
+
+    results = []
+    for start in range(0, len(positions), BATCH):
+        batch = slice(start, start + BATCH)
+        rows, ends, data, lengths, strengths = _decode_frames(
+            pulses, positions[batch], is_v2[batch], unit[batch]
+        )
+        frame_positions = positions[batch][rows]
+        results.append(
+            (frame_positions, frame_positions + 2 + ends, data, lengths, strengths)
+        )
+    if not results:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, np.zeros((0, MAX_BYTES), dtype=np.uint8), empty, np.zeros(0)
+    frame_positions, frame_ends, data, lengths, strengths = [
+        np.concatenate(result) for result in zip(*results)
+    ]
+    if overlapping:
+        return frame_positions, data, lengths, strengths
+
+    # like IRDecoder, a frame is only found once the previous one ended. A
+    # frame that starts after every earlier frame ended is always kept, the
+    # rest are decided in order.
+    keep = np.ones(len(frame_positions), dtype=bool)
+    if len(keep) > 1:
+        keep[1:] = frame_positions[1:] > np.maximum.accumulate(frame_ends)[:-1]
+    clear = np.nonzero(keep)[0]
+    last_kept = -1
+    for frame in np.nonzero(~keep)[0]:
+        previous = clear[np.searchsorted(clear, frame) - 1]
+        if last_kept > previous:
+            previous = last_kept
+        if frame_positions[frame] > frame_ends[previous]:
+            keep[frame] = True
+            last_kept = frame
+    return frame_positions[keep], data[keep], lengths[keep], strengths[keep]
+
+
+def decode(pulses, overlapping=False):
+    # returns (position, payload, strength) of every frame IRDecoder would
+    # return, in order
+    positions, data, lengths, strengths = decode_arrays(pulses, overlapping)
+    return [
+        (int(position), data[frame, :length].tobytes(), float(strength))
+        for frame, (position, length, strength) in enumerate(
+            zip(positions, lengths, strengths)
+        )
+    ]
+
+
+def scalar_decode(pulses):
+    # FEC frames are left out as they are here, noise taken for an FEC
+    # header can still decode to a frame that passes its CRC
+    decoder = infrared.IRDecoder()
+    packets = []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for pulse in pulses:
+            packet = decoder.decode(int(pulse))
+            if packet is not None and not packet.fec:
+                packets.append((bytes(packet.data), packet.strength))
+    return packets
+
+
+def load_capture(path):
+    with open(path, "rb") as file:
+        replay = CaptureReplay(file)
+    return np.frombuffer(replay._pulses, dtype=np.uint16).astype(np.int32)
+
+
+def generate(frames, seed=1, jitter_us=30, noise=True):
+    # a mixed V1 and V2 stream at several units with noise and broken frames
+    rng = random.Random(seed)
+    encoders = [
+        infrared.IREncoder(protocol, unit)
+        for protocol in (1, 2)
+        for unit in (350, 500, 650)
+    ]
+    pulses = []
+    for i in range(frames):
+        payload = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 8)))
+        durations = list(rng.choice(encoders).encode(payload))
+        if noise and rng.random() < 0.1:
+            durations = durations[: rng.randrange(1, len(durations))]
+        if noise:
+            pulses += [rng.randrange(100, 20000) for _ in range(rng.randrange(3))]
+        pulses += [max(1, int(d + rng.gauss(0, jitter_us))) for d in durations]
+    return np.array(pulses, dtype=np.int32)
+
+
+def _subsequence(found, expected):
+    remaining = iter(found)
+    return all(any(item == other for other in remaining) for item in expected)
+
+
+def check(pulses, strict):
+    # IRDecoder only looks back a few pulses when a frame breaks and doesn't
+    # go back after a bad CRC, so with noise it can miss a frame this finds.
+    # Noise can also pass a CRC here in a frame IRDecoder never started, and
+    # that frame then hides the real one behind it. Everything IRDecoder
+    # returns has to be among the frames found with overlapping ones in the
+    # same order, and on a stream without noise the two have to agree
+    # exactly.
+    started = time.perf_counter()
+    decode_arrays(pulses)
+    vector_seconds = time.perf_counter() - started
+    vector = decode(pulses)
+    started = time.perf_counter()
+    scalar = scalar_decode(pulses)
+    scalar_seconds = time.perf_counter() - started
+
+    found = [(payload, strength) for position, payload, strength in vector]
+    if strict:
+        same = found == scalar
+        result = "identical" if same else "DIFFERENT"
+    else:
+        candidates = [
+            (payload, strength) for position, payload, strength in decode(pulses, True)
+        ]
+        same = _subsequence(candidates, scalar)
+        result = (
+            "{} more than scalar".format(len(found) - len(scalar))
+            if same
+            else "MISSING PACKETS"
+        )
+    print(
+        "{} pulses: vector {} packets in {:.3f}s ({:.1f}M pulses/s), "
+        "scalar {} packets in {:.3f}s, {}".format(
+            len(pulses),
+            len(vector),
+            vector_seconds,
+            len(pulses) / vector_seconds / 1000000,
+            len(scalar),
+            scalar_seconds,
+            result,
+        )
+    )
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "captures", nargs="*", help="capture files, a generated stream when empty"
+    )
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.captures:
+        streams = [(load_capture(path), False) for path in args.captures]
+    else:
+        streams = [
+            (generate(args.frames, args.seed, noise=False), True),
+            (generate(args.frames, args.seed), False),
+        ]
+    if not all([check(pulses, strict) for pulses, strict in streams]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,14 @@ from hardware import Hardware
 from state import State, StateMachine
 from sound import Sound
 
-hw = Hardware()
-hw.setup_neopixels("target1", data=board.D5, count=1, brightness=0.2)
-
-hw.setup_audio(board.A0)
-sound = Sound(hw.audio, volume=0.1, voices=2)
-
-hw.setup_piezo_sensor("target1", board.A1)
+hw = Hardware(
+    {
+        "pixels": {"target1": {"data": board.D5, "count": 1, "brightness": 0.2}},
+        "audio": {"pin": board.A0},
+        "piezos": {"target1": {"pin": board.A1}},
+    }
+)
+sound = Sound(lambda: hw.audio, volume=0.1, voices=2)
 
 # new_target_delay is set to 4 seconds at start
 # new_target_delay decreases on each successful hit
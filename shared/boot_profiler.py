@@ -0,0 +1,93 @@
+import gc
+import time
+
+
+class BootProfiler(object):
+    # Measures the steps of startup, such as imports and Hardware setups,
+    # with the time each takes and the heap it leaves allocated. The heap
+    # is read after a collection so only what the step keeps counts, and
+    # the collections aren't part of any step's time. Steps can nest: a
+    # setup includes the driver import it makes.
+    #
+    # A step left by an exception, such as an optional import that isn't
+    # there, is reported as failed with the exception type.
+    #
+    # A disabled profiler hands out one shared step that measures nothing,
+    # so the steps can stay in the code.
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # (depth, name, nanoseconds, heap bytes, exception type or None) in
+        # the order steps started
+        self._steps = []
+        self._depth = 0
+        self._collect_time = 0
+
+    def step(self, name: str):
+        if not self.enabled:
+            return _NO_STEP
+        return _Step(self, name)
+
+    def _collect(self):
+        start = time.monotonic_ns()
+        gc.collect()
+        free = gc.mem_free()
+        self._collect_time += time.monotonic_ns() - start
+        return free
+
+    def report(self):
+        if not self.enabled:
+            return
+        for depth, name, elapsed, heap, failure in self._steps:
+            if failure is not None:
+                name += " FAILED " + failure.__name__
+            print(
+                "Boot - " + "  " * depth + name,
+                "Time (ms):",
+                elapsed / 1000000,
+                "Heap:",
+                heap,
+            )
+        print("Boot - Free Heap:", self._collect())
+
+
+class _Step(object):
+    def __init__(self, profiler: BootProfiler, name: str):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        profiler = self._profiler
+        self._index = len(profiler._steps)
+        self._depth = profiler._depth
+        profiler._steps.append(None)
+        profiler._depth += 1
+        self._free = profiler._collect()
+        self._collect_time = profiler._collect_time
+        self._start = time.monotonic_ns()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        end = time.monotonic_ns()
+        profiler = self._profiler
+        # nested steps collect too
+        elapsed = end - self._start - (profiler._collect_time - self._collect_time)
+        heap = self._free - profiler._collect()
+        profiler._depth -= 1
+        profiler._steps[self._index] = (
+            self._depth,
+            self._name,
+            elapsed,
+            heap,
+            exception_type,
+        )
+
+
+class _NoStep(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        pass
+
+
+_NO_STEP = _NoStep()
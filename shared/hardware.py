@@ -2,36 +2,49 @@ try:
     from typing import Optional
 except ImportError:
     pass
+import array
 import board
 import microcontroller
 from digitalio import DigitalInOut, Direction, Pull
-from analogio import AnalogIn
 import time
-import busio
-import pwmio
-import touchio
-import pulseio
-import adafruit_pixelbuf
-import neopixel
+import struct
 
-try:
-    import adafruit_lis3dh
-except ImportError:
-    adafruit_lis3dh = None
-try:
-    import adafruit_dotstar
-except ImportError:
-    adafruit_dotstar = None
+from boot_profiler import BootProfiler
 
-try:
-    from audioio import AudioOut
-except ImportError:
-    from audiopwmio import PWMAudioOut as AudioOut
+# Driver modules are imported by the setup that needs them, see
+# Hardware._import, so a program doesn't pay the RAM and boot time of
+# drivers for hardware it doesn't have.
 
-try:
-    import mindwidgets_df1201s
-except ImportError:
-    mindwidgets_df1201s = None
+
+# LIS3DH output data rate in Hz, gestures don't need more
+ACCELEROMETER_SAMPLE_RATE = 100
+# samples left to collect in the FIFO between burst reads, it holds 32
+ACCELEROMETER_BURST = 8
+# samples kept in Hardware.acceleration_history, 1.28s at 100 Hz
+ACCELERATION_HISTORY = 128
+
+AXIS_X = 0
+AXIS_Y = 1
+AXIS_Z = 2
+
+# adafruit_lis3dh.RANGE_*_G by range in g, so a range can be picked before
+# the driver is imported
+LIS3DH_RANGES = {2: 0b00, 4: 0b01, 8: 0b10, 16: 0b11}
+
+_LIS3DH_CTRL_REG5 = 0x24
+_LIS3DH_FIFO_ENABLE = 0x40
+_LIS3DH_FIFO_CTRL = 0x2E
+_LIS3DH_FIFO_STREAM = 0x80
+_LIS3DH_FIFO_SRC = 0x2F
+_LIS3DH_FIFO_SAMPLES = 0x1F
+_LIS3DH_FIFO_OVERRUN = 0x40
+_LIS3DH_FIFO_SIZE = 32
+# the address MSB makes a read step through the registers, the X, Y and Z
+# registers wrap around so one read can take every sample in the FIFO
+_LIS3DH_OUT_X_L_AUTO_INCREMENT = 0x28 | 0x80
+
+
+_NO_SAMPLES = ()
 
 
 class Acceleration(object):
@@ -40,12 +53,248 @@ class Acceleration(object):
         self.y: float = 0.0
         self.z: float = 0.0
 
+    def __iter__(self):
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __getitem__(self, index: int) -> float:
+        return (self.x, self.y, self.z)[index]
+
+
+def _ticks(seconds: float) -> int:
+    # a float32 monotonic time can't tell samples milliseconds apart after
+    # a few minutes, so the history keeps whole milliseconds
+    return round(seconds * 1000)
+
+
+class AccelerationHistory(object):
+    # Ring of the most recent samples in g with their monotonic timestamps.
+    # The queries walk back from the newest sample and don't allocate. Their
+    # since argument limits them to samples taken at or after that time, and
+    # when there are none they return default.
+    def __init__(self, size: int = ACCELERATION_HISTORY):
+        self._axes = (
+            array.array("f", [0] * size),
+            array.array("f", [0] * size),
+            array.array("f", [0] * size),
+        )
+        # milliseconds, see _ticks
+        self._times = array.array("L", [0] * size)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+    def add(self, x: float, y: float, z: float, timestamp: float):
+        index = self._next
+        self._axes[AXIS_X][index] = x
+        self._axes[AXIS_Y][index] = y
+        self._axes[AXIS_Z][index] = z
+        self._times[index] = _ticks(timestamp)
+        self._next = (index + 1) % len(self._times)
+        if self._count < len(self._times):
+            self._count += 1
+
+    @property
+    def latest_time(self) -> Optional[float]:
+        if self._count == 0:
+            return None
+        return self._times[self._next - 1] / 1000
+
+    def value(self, axis: int, age: int = 0) -> float:
+        # age 0 is the newest sample
+        if age >= self._count:
+            raise IndexError("acceleration history index out of range")
+        return self._axes[axis][(self._next - 1 - age) % len(self._times)]
+
+    def _window(self, since: float) -> int:
+        # how many of the newest samples were taken at or after since
+        times = self._times
+        size = len(times)
+        since = _ticks(since)
+        count = 0
+        while count < self._count and times[(self._next - 1 - count) % size] >= since:
+            count += 1
+        return count
+
+    def min(
+        self, axis: int, since: float = 0.0, default: Optional[float] = None
+    ) -> Optional[float]:
+        values = self._axes[axis]
+        size = len(values)
+        result = default
+        for age in range(self._window(since)):
+            value = values[(self._next - 1 - age) % size]
+            if age == 0 or value < result:
+                result = value
+        return result
+
+    def max(
+        self, axis: int, since: float = 0.0, default: Optional[float] = None
+    ) -> Optional[float]:
+        values = self._axes[axis]
+        size = len(values)
+        result = default
+        for age in range(self._window(since)):
+            value = values[(self._next - 1 - age) % size]
+            if age == 0 or value > result:
+                result = value
+        return result
+
+    def mean(
+        self, axis: int, since: float = 0.0, default: Optional[float] = None
+    ) -> Optional[float]:
+        count = self._window(since)
+        if count == 0:
+            return default
+        values = self._axes[axis]
+        size = len(values)
+        total = 0.0
+        for age in range(count):
+            total += values[(self._next - 1 - age) % size]
+        return total / count
+
+    def latest(self, axis: int, into) -> int:
+        # copies the newest len(into) values of the axis into it, oldest
+        # first, and returns how many there were
+        count = min(len(into), self._count)
+        values = self._axes[axis]
+        size = len(values)
+        start = self._next - count
+        for i in range(count):
+            into[i] = values[(start + i) % size]
+        return count
+
+
+class LIS3DHFifo(object):
+    # Keeps the LIS3DH FIFO in stream mode and reads every sample collected
+    # since the last read in one I2C transfer, instead of one transfer per
+    # main loop pass. Samples are in g.
+    def __init__(self, accelerometer, i2c, address: int, sample_rate: int):
+        # both already imported by the LIS3DH setup
+        import adafruit_lis3dh
+        from adafruit_bus_device.i2c_device import I2CDevice
+
+        self._device = I2CDevice(i2c, address)
+        self._register = bytearray(2)
+        self._buffer = bytearray(_LIS3DH_FIFO_SIZE * 6)
+        # filled by read(), which returns how many are new
+        self.samples = [Acceleration() for i in range(_LIS3DH_FIFO_SIZE)]
+        self._divisor = {
+            LIS3DH_RANGES[2]: 16380,
+            LIS3DH_RANGES[4]: 8190,
+            LIS3DH_RANGES[8]: 4096,
+            LIS3DH_RANGES[16]: 1365,
+        }[accelerometer.range]
+
+        # the slowest data rate that is at least the sample rate
+        data_rates = (
+            (1, adafruit_lis3dh.DATARATE_1_HZ),
+            (10, adafruit_lis3dh.DATARATE_10_HZ),
+            (25, adafruit_lis3dh.DATARATE_25_HZ),
+            (50, adafruit_lis3dh.DATARATE_50_HZ),
+            (100, adafruit_lis3dh.DATARATE_100_HZ),
+            (200, adafruit_lis3dh.DATARATE_200_HZ),
+            (400, adafruit_lis3dh.DATARATE_400_HZ),
+            (1344, adafruit_lis3dh.DATARATE_1344_HZ),
+        )
+        for rate, data_rate in data_rates:
+            if rate >= sample_rate:
+                break
+        accelerometer.data_rate = data_rate
+        self.sample_rate = rate
+        self.read_interval = ACCELEROMETER_BURST / rate
+
+        self._write(
+            _LIS3DH_CTRL_REG5, self._read(_LIS3DH_CTRL_REG5, 1)[0] | _LIS3DH_FIFO_ENABLE
+        )
+        self._write(_LIS3DH_FIFO_CTRL, _LIS3DH_FIFO_STREAM)
+        self.overruns = 0
+
+    def _write(self, register: int, value: int):
+        self._register[0] = register
+        self._register[1] = value
+        with self._device as i2c:
+            i2c.write(self._register)
+
+    def _read(self, register: int, length: int):
+        self._register[0] = register
+        with self._device as i2c:
+            i2c.write_then_readinto(
+                self._register, self._buffer, out_end=1, in_end=length
+            )
+        return self._buffer
+
+    def read(self) -> int:
+        # reads the samples collected since the last read into the start of
+        # samples, oldest first, and returns how many there were
+        status = self._read(_LIS3DH_FIFO_SRC, 1)[0]
+        count = status & _LIS3DH_FIFO_SAMPLES
+        if status & _LIS3DH_FIFO_OVERRUN:
+            # full and the oldest samples overwritten, read less than
+            # ACCELEROMETER_BURST apart next time
+            self.overruns += 1
+            count = _LIS3DH_FIFO_SIZE
+        if count == 0:
+            return 0
+
+        buffer = self._read(_LIS3DH_OUT_X_L_AUTO_INCREMENT, count * 6)
+        divisor = self._divisor
+        samples = self.samples
+        for i in range(count):
+            x, y, z = struct.unpack_from("<hhh", buffer, i * 6)
+            sample = samples[i]
+            sample.x = x / divisor
+            sample.y = y / divisor
+            sample.z = z / divisor
+        return count
+
+
+def _board_pin(pin) -> microcontroller.Pin:
+    # manifests loaded from JSON name their pins
+    if isinstance(pin, str):
+        return getattr(board, pin)
+    return pin
+
+
+def _pull(pull) -> Pull:
+    if isinstance(pull, str):
+        return getattr(Pull, pull)
+    return pull
+
+
+def _profiled(name: str):
+    # times a setup method in the Hardware's BootProfiler. The name is
+    # given because small CircuitPython builds have no function __name__.
+    def decorate(setup):
+        def profiled(self, *args, **kwargs):
+            with self._profiler.step(name):
+                return setup(self, *args, **kwargs)
+
+        return profiled
+
+    return decorate
+
 
 class Hardware(object):
-    def __init__(self):
+    def __init__(self, manifest=None, profiler: Optional[BootProfiler] = None):
+        # a BootProfiler to time the driver imports and setup calls in,
+        # see BootProfiler.report()
+        self._profiler = profiler if profiler is not None else BootProfiler(False)
+        self._drivers = {}
         self._i2c = None
         self._accelerometer = None
+        self._accelerometer_fifo: Optional[LIS3DHFifo] = None
         self._current_acceleration: Optional[Acceleration] = None
+        self._acceleration_sample_count = 0
+        self._acceleration_history: Optional[AccelerationHistory] = None
+        self._next_acceleration_read = 0
         self._pixels = {}
         self._audio = None
         self._ir_pulsein = None
@@ -56,7 +305,151 @@ class Hardware(object):
         self._switches = {}
         self._piezos = {}
 
+        # buttons, switches and touch pads are read once per update() into
+        # bitmasks, one bit per input in the order they were set up
+        self._input_bits = {}
+        self._input_reads = []
+        self._inputs = 0
+        self._inputs_pressed = 0
+        self._inputs_released = 0
+
+        # setups from the manifest that haven't run yet, by peripheral
+        self._pending = {}
+
         self._last_update_time = time.monotonic()
+        if manifest is not None:
+            self.load_manifest(manifest)
+
+    def load_manifest(self, manifest):
+        # manifest is a dict, or the path of a JSON file with the same keys.
+        # Pins are board pin names or pin objects, pulls "UP" or "DOWN".
+        #
+        #   {
+        #       "lis3dh": {"onboard": True, "range": 4, "sample_rate": 100},
+        #       "pixels": {
+        #           "blade": {"type": "dotstar", "clock": "A3", "data": "A1",
+        #                     "count": 14, "brightness": 0.2},
+        #           "health": {"data": "NEOPIXEL", "count": 10, "brightness": 0.2},
+        #       },
+        #       "audio": {"onboard": True},
+        #       "dfplayer": {"tx": "TX", "rx": "RX", "volume": 0.2},
+        #       "ir_in": {"pin": "D0", "max_pulses": 256},
+        #       "ir_out": {"pin": "D1"},
+        #       "buttons": {"trigger": {"pin": "A2", "pull": "UP"}},
+        #       "switches": {"switch": {"pin": "SLIDE_SWITCH", "pull": "UP"}},
+        #       "touch": {"pad": {"pin": "A4"}},
+        #       "piezos": {"target1": {"pin": "A1"}},
+        #   }
+        #
+        # Each peripheral is set up the first time it is used, so the RAM
+        # and boot time of one a session never touches is never spent.
+        # Buttons, switches and touch pads are read by every update() and
+        # are set up right away.
+        if isinstance(manifest, str):
+            # only a manifest file pays for the json module
+            with open(manifest) as file:
+                manifest = self._import("json").load(file)
+
+        lis3dh = manifest.get("lis3dh")
+        if lis3dh is not None:
+            options = {}
+            if "range" in lis3dh:
+                options["range"] = LIS3DH_RANGES[lis3dh["range"]]
+            for key in ("sample_rate", "history_size"):
+                if key in lis3dh:
+                    options[key] = lis3dh[key]
+            if lis3dh.get("onboard"):
+                self._defer("accelerometer", self.setup_onboard_lis3dh, options)
+            else:
+                if "interrupt" in lis3dh:
+                    options["interrupt_pin"] = _board_pin(lis3dh["interrupt"])
+                self._defer("accelerometer", self.setup_lis3dh, options)
+
+        pixels = manifest.get("pixels", {})
+        for name in pixels:
+            options = pixels[name]
+            setup_options = {
+                "name": name,
+                "data": _board_pin(options["data"]),
+                "count": options["count"],
+                "brightness": options.get("brightness", 0.2),
+            }
+            if options.get("type") == "dotstar":
+                setup_options["clock"] = _board_pin(options["clock"])
+                self._defer("pixels", self.setup_dotstars, setup_options)
+            else:
+                self._defer("pixels", self.setup_neopixels, setup_options)
+
+        audio = manifest.get("audio")
+        if audio is not None:
+            if audio.get("onboard"):
+                self._defer("audio", self.setup_onboard_audio, {})
+            else:
+                self._defer(
+                    "audio", self.setup_audio, {"pin": _board_pin(audio["pin"])}
+                )
+
+        dfplayer = manifest.get("dfplayer")
+        if dfplayer is not None:
+            options = {
+                "tx": _board_pin(dfplayer["tx"]),
+                "rx": _board_pin(dfplayer["rx"]),
+            }
+            if "volume" in dfplayer:
+                options["volume"] = dfplayer["volume"]
+            self._defer("dfplayer", self.setup_dfplayer_pro, options)
+
+        ir_in = manifest.get("ir_in")
+        if ir_in is not None:
+            options = {"pin": _board_pin(ir_in["pin"])}
+            if "max_pulses" in ir_in:
+                options["max_pulses"] = ir_in["max_pulses"]
+            self._defer("ir_in", self.setup_ir_in, options)
+
+        ir_out = manifest.get("ir_out")
+        if ir_out is not None:
+            self._defer("ir_out", self.setup_ir_out, {"pin": _board_pin(ir_out["pin"])})
+
+        piezos = manifest.get("piezos", {})
+        for name in piezos:
+            options = {"name": name, "pin": _board_pin(piezos[name]["pin"])}
+            self._defer("piezos", self.setup_piezo_sensor, options)
+
+        buttons = manifest.get("buttons", {})
+        for name in buttons:
+            options = buttons[name]
+            self.setup_button(name, _board_pin(options["pin"]), _pull(options["pull"]))
+        switches = manifest.get("switches", {})
+        for name in switches:
+            options = switches[name]
+            self.setup_switch(name, _board_pin(options["pin"]), _pull(options["pull"]))
+        touch = manifest.get("touch", {})
+        for name in touch:
+            self.setup_capitive_touch(name, _board_pin(touch[name]["pin"]))
+
+    def _defer(self, peripheral: str, setup, options: dict):
+        if peripheral not in self._pending:
+            self._pending[peripheral] = []
+        self._pending[peripheral].append((setup, options))
+
+    def _use(self, peripheral: str):
+        # runs the manifest setups of a peripheral the first time it's used
+        setups = self._pending.pop(peripheral, None)
+        if setups is not None:
+            for setup, options in setups:
+                setup(**options)
+
+    def _import(self, name: str):
+        # imports a driver module the first time a setup needs it,
+        # "package.module" names return the module
+        module = self._drivers.get(name)
+        if module is None:
+            with self._profiler.step("import " + name):
+                module = __import__(name)
+                for part in name.split(".")[1:]:
+                    module = getattr(module, part)
+            self._drivers[name] = module
+        return module
 
     def _digital_in(self, pin: microcontroller.Pin, pull: Direction):
         input = DigitalInOut(pin)
@@ -70,6 +463,7 @@ class Hardware(object):
         output.value = value
         return output
 
+    @_profiled("setup_i2c")
     def setup_i2c(
         self,
         scl_pin: microcontroller.Pin = board.SCL,
@@ -78,38 +472,71 @@ class Hardware(object):
     ):
         if self._i2c is not None:
             return
+        busio = self._import("busio")
         self._i2c = busio.I2C(scl_pin, sda_pin, frequency=frequency)
         print("I2C - SCL Pin:", scl_pin, "SDA Pin:", sda_pin, "Frequency:", frequency)
 
+    @_profiled("setup_lis3dh")
     def setup_lis3dh(
         self,
         interrupt_pin: Optional[microcontroller.Pin] = None,
-        range: int = adafruit_lis3dh.RANGE_4_G,
+        range: int = LIS3DH_RANGES[4],
+        sample_rate: int = ACCELEROMETER_SAMPLE_RATE,
+        history_size: int = ACCELERATION_HISTORY,
     ):
         if self._i2c is None:
             self.setup_i2c()
+        adafruit_lis3dh = self._import("adafruit_lis3dh")
         int1 = DigitalInOut(interrupt_pin) if interrupt_pin else None
         self._accelerometer = adafruit_lis3dh.LIS3DH_I2C(self._i2c, int1=int1)
         self._accelerometer.range = range
+        self._setup_accelerometer_fifo(0x18, sample_rate, history_size)
         print("Accelerometer - Interrupt Pin:", interrupt_pin)
 
-    def setup_onboard_lis3dh(self, range: int = adafruit_lis3dh.RANGE_4_G):
+    @_profiled("setup_onboard_lis3dh")
+    def setup_onboard_lis3dh(
+        self,
+        range: int = LIS3DH_RANGES[4],
+        sample_rate: int = ACCELEROMETER_SAMPLE_RATE,
+        history_size: int = ACCELERATION_HISTORY,
+    ):
         if self._i2c is None:
             self.setup_i2c()
+        adafruit_lis3dh = self._import("adafruit_lis3dh")
         int1 = DigitalInOut(board.ACCELEROMETER_INTERRUPT)
         self._accelerometer = adafruit_lis3dh.LIS3DH_I2C(
             self._i2c, address=0x19, int1=int1
         )
         self._accelerometer.range = range
+        self._setup_accelerometer_fifo(0x19, sample_rate, history_size)
         print("Accelerometer - Onboard")
 
+    def _setup_accelerometer_fifo(
+        self, address: int, sample_rate: int, history_size: int
+    ):
+        self._accelerometer_fifo = LIS3DHFifo(
+            self._accelerometer, self._i2c, address, sample_rate
+        )
+        self._current_acceleration = Acceleration()
+        self._acceleration_history = AccelerationHistory(history_size)
+        self._next_acceleration_read = 0
+        print(
+            "Accelerometer FIFO - Sample Rate:",
+            self._accelerometer_fifo.sample_rate,
+            "Read Interval:",
+            self._accelerometer_fifo.read_interval,
+        )
+
+    @_profiled("setup_neopixels")
     def setup_neopixels(
         self, name: str, data: microcontroller.Pin, count: int, brightness: float
     ):
+        neopixel = self._import("neopixel")
         pixels = neopixel.NeoPixel(data, count, brightness=brightness, auto_write=False)
         self._pixels[name] = pixels
         print("Pixels - Name:", name, "Data Pin:", data, "Count:", count)
 
+    @_profiled("setup_dotstars")
     def setup_dotstars(
         self,
         name: str,
@@ -118,120 +545,241 @@ class Hardware(object):
         count: int,
         brightness: float,
     ):
+        adafruit_dotstar = self._import("adafruit_dotstar")
         pixels = adafruit_dotstar.DotStar(
             clock, data, count, brightness=brightness, auto_write=False
         )
         self._pixels[name] = pixels
         print("Dotstars - Name:", name, "Data Pin:", data, "Count:", count)
 
+    def _audio_out(self):
+        try:
+            return self._import("audioio").AudioOut
+        except ImportError:
+            return self._import("audiopwmio").PWMAudioOut
+
+    @_profiled("setup_onboard_audio")
     def setup_onboard_audio(self):
         self._digital_out(board.SPEAKER_ENABLE, True)
-        self._audio = AudioOut(board.SPEAKER)
+        self._audio = self._audio_out()(board.SPEAKER)
         print("Audio - Onboard")
 
+    @_profiled("setup_audio")
     def setup_audio(self, pin: microcontroller.Pin):
-        self._audio = AudioOut(pin)
+        self._audio = self._audio_out()(pin)
         print("Audio - Pin:", pin)
 
+    @_profiled("setup_dfplayer_pro")
     def setup_dfplayer_pro(
         self, tx: microcontroller.Pin, rx: microcontroller.Pin, volume: float = 0.2
     ):
+        busio = self._import("busio")
+        mindwidgets_df1201s = self._import("mindwidgets_df1201s")
         dfplayer_uart = busio.UART(tx, rx, baudrate=115200)
         self._dfplayer = mindwidgets_df1201s.DF1201S(dfplayer_uart)
         self._dfplayer.volume = volume
         self._dfplayer.play_mode = mindwidgets_df1201s.DF1201S.PLAYMODE_PLAY_ONCE
         print("DFPlayer Pro - TX:", tx, "RX:", rx)
 
+    @_profiled("setup_ir_in")
     def setup_ir_in(self, pin: microcontroller.Pin, max_pulses: int = 256):
+        pulseio = self._import("pulseio")
         self._ir_pulsein = pulseio.PulseIn(pin, maxlen=max_pulses, idle_state=True)
         print("IR receiver - Pin:", pin, "Max Pulses:", max_pulses)
 
+    @_profiled("setup_ir_out")
     def setup_ir_out(self, pin: microcontroller.Pin):
+        pwmio = self._import("pwmio")
+        pulseio = self._import("pulseio")
         self._ir_pwmout = pwmio.PWMOut(pin, frequency=38000, duty_cycle=2**15)
         self._ir_pulseout = pulseio.PulseOut(self._ir_pwmout)
         print("IR transmitter - Pin:", pin)
 
+    def _add_input(self, name: str, input, on):
+        if name in self._input_bits:
+            raise RuntimeError("Input name already used: ", name)
+        bit = 1 << len(self._input_reads)
+        self._input_bits[name] = bit
+        self._input_reads.append((input, on, bit))
+
+    @_profiled("setup_button")
     def setup_button(self, name, pin: microcontroller.Pin, pull):
         self._buttons[name] = self._digital_in(pin, pull)
+        self._add_input(name, self._buttons[name], 0 if pull == Pull.UP else 1)
         print("Button - Name:", name, "Pin:", pin, "Pull:", pull)
 
+    @_profiled("setup_capitive_touch")
     def setup_capitive_touch(self, name: str, pin: microcontroller.Pin):
+        touchio = self._import("touchio")
         self._cap_touch[name] = touchio.TouchIn(pin)
+        self._add_input(name, self._cap_touch[name], True)
         print("Capacitive Touch - Name:", name, "Pin:", pin)
 
+    @_profiled("setup_switch")
     def setup_switch(self, name, pin: microcontroller.Pin, pull):
         self._switches[name] = self._digital_in(pin, pull)
+        self._add_input(name, self._switches[name], 0 if pull == Pull.UP else 1)
         print("Switch - Name:", name, "Pin:", pin, "Pull:", pull)
 
+    @_profiled("setup_piezo_sensor")
     def setup_piezo_sensor(self, name: str, pin: microcontroller.Pin):
-        self._piezos[name] = AnalogIn(pin)
+        analogio = self._import("analogio")
+        self._piezos[name] = analogio.AnalogIn(pin)
         print("Piezo - Name:", name, "Pin:", pin)
 
     def update(self):
-        if self._accelerometer is not None:
-            acceleration = self._accelerometer.acceleration
-            if not self._current_acceleration:
-                self._current_acceleration = Acceleration()
-            self._current_acceleration.x = (
-                acceleration[0] / adafruit_lis3dh.STANDARD_GRAVITY
-            )
-            self._current_acceleration.y = (
-                acceleration[1] / adafruit_lis3dh.STANDARD_GRAVITY
-            )
-            self._current_acceleration.z = (
-                acceleration[2] / adafruit_lis3dh.STANDARD_GRAVITY
-            )
-
+        inputs = 0
+        for input, on, bit in self._input_reads:
+            if input.value == on:
+                inputs |= bit
+        self._inputs_pressed = inputs & ~self._inputs
+        self._inputs_released = self._inputs & ~inputs
+        self._inputs = inputs
+
+        # the accelerometer is read once something asked for acceleration
+        # and set it up, until then there is no FIFO to read
         current_time = time.monotonic()
+        self._acceleration_sample_count = 0
+        if (
+            self._accelerometer_fifo is not None
+            and current_time >= self._next_acceleration_read
+        ):
+            # the FIFO collects samples between reads, so most passes skip
+            # the I2C bus entirely
+            self._read_acceleration(current_time)
+
         self._ellapsed_time = current_time - self._last_update_time
         self._last_update_time = time.monotonic()
 
+    def read_acceleration(self):
+        # reads the FIFO now instead of at the next update() that is due,
+        # for a state that needs every sample up to this moment, such as
+        # when a trigger is pressed or released
+        if self._pending:
+            self._use("accelerometer")
+        if self._accelerometer_fifo is not None:
+            self._read_acceleration(time.monotonic())
+
+    def _read_acceleration(self, current_time: float):
+        fifo = self._accelerometer_fifo
+        self._next_acceleration_read = current_time + fifo.read_interval
+        count = fifo.read()
+        self._acceleration_sample_count = count
+        if count == 0:
+            return
+        samples = fifo.samples
+        latest = samples[count - 1]
+        self._current_acceleration.x = latest.x
+        self._current_acceleration.y = latest.y
+        self._current_acceleration.z = latest.z
+
+        # the newest sample was taken about now, the others one sample
+        # period apart before it
+        history = self._acceleration_history
+        period = 1 / fifo.sample_rate
+        timestamp = current_time - (count - 1) * period
+        for i in range(count):
+            sample = samples[i]
+            history.add(sample.x, sample.y, sample.z, timestamp)
+            timestamp += period
+
     @property
     def ellapsed_time(self) -> float:
         return self._ellapsed_time
 
     @property
-    def pixels(self) -> dict[str, adafruit_pixelbuf.PixelBuf]:
+    def pixels(self) -> "dict[str, adafruit_pixelbuf.PixelBuf]":
+        if self._pending:
+            self._use("pixels")
         return self._pixels
 
     @property
     def current_acceleration(self) -> Optional[Acceleration]:
+        if self._pending:
+            self._use("accelerometer")
         return self._current_acceleration if self._accelerometer else None
 
     @property
-    def audio(self) -> Optional[AudioOut]:
+    def acceleration_history(self) -> Optional[AccelerationHistory]:
+        if self._pending:
+            self._use("accelerometer")
+        return self._acceleration_history
+
+    @property
+    def acceleration_samples(self):
+        # the first acceleration_sample_count are the samples of the last
+        # read, oldest first. They are reused, copy any that are kept.
+        if self._pending:
+            self._use("accelerometer")
+        if self._accelerometer_fifo is None:
+            return _NO_SAMPLES
+        return self._accelerometer_fifo.samples
+
+    @property
+    def acceleration_sample_count(self) -> int:
+        # samples read by the last update() or read_acceleration(), 0 when
+        # neither read the FIFO
+        return self._acceleration_sample_count
+
+    @property
+    def audio(self) -> "Optional[audioio.AudioOut]":
+        if self._pending:
+            self._use("audio")
         return self._audio
 
     @property
-    def ir_pulseout(self) -> Optional[pulseio.PulseOut]:
+    def ir_pulseout(self) -> "Optional[pulseio.PulseOut]":
+        if self._pending:
+            self._use("ir_out")
         return self._ir_pulseout
 
     @property
-    def ir_pulsein(self) -> Optional[pulseio.PulseIn]:
+    def ir_pulsein(self) -> "Optional[pulseio.PulseIn]":
+        if self._pending:
+            self._use("ir_in")
         return self._ir_pulsein
 
     @property
-    def dfplayer(self) -> Optional[mindwidgets_df1201s.DF1201S]:
+    def dfplayer(self) -> "Optional[mindwidgets_df1201s.DF1201S]":
+        if self._pending:
+            self._use("dfplayer")
         return self._dfplayer
 
+    def input_bit(self, name: str) -> int:
+        # look the bit up once and test it against inputs, inputs_pressed
+        # or inputs_released every frame
+        return self._input_bits[name]
+
+    @property
+    def inputs(self) -> int:
+        # bits of the inputs that were on at the last update()
+        return self._inputs
+
+    @property
+    def inputs_pressed(self) -> int:
+        # bits of the inputs that turned on at the last update()
+        return self._inputs_pressed
+
+    @property
+    def inputs_released(self) -> int:
+        # bits of the inputs that turned off at the last update()
+        return self._inputs_released
+
     def button_down(self, name: str) -> bool:
-        button = self._buttons[name]
-        on = 0 if button.pull == Pull.UP else 1
-        return button.value == on
+        return self._inputs & self._input_bits[name] != 0
 
     def cap_touch(self, name: str) -> bool:
-        cap_touch = self._cap_touch[name]
-        return cap_touch.value
+        return self._inputs & self._input_bits[name] != 0
 
     def cap_touch_raw(self, name: str) -> int:
         cap_touch = self._cap_touch[name]
         return cap_touch.raw_value
 
     def switch_on(self, name: str) -> bool:
-        switch = self._switches[name]
-        on = 0 if switch.pull == Pull.UP else 1
-        return switch.value == on
+        return self._inputs & self._input_bits[name] != 0
 
     def piezo(self, name: str) -> float:
+        if self._pending:
+            self._use("piezos")
         piezo = self._piezos[name]
         return piezo.value / 65536
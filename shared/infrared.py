@@ -1,4 +1,5 @@
 import array
+import random
 import time
 
 IR_UNIT = 500
@@ -11,142 +12,922 @@ IR_ZERO = IR_UNIT
 IR_ONE = IR_UNIT * 3
 IR_LEAD_OUT = IR_UNIT * 10
 
+# protocol versions, the decoder tells them apart by the header space
+# V1 - one bit per pulse, IR_ZERO or IR_ONE
+# V2 - two bits per pulse as one of four duration levels
+IR_PROTOCOL_V1 = 1
+IR_PROTOCOL_V2 = 2
+
+IR_V2_HEADER_SPACE = IR_UNIT * 4
+# durations for the bit pairs 00, 01, 10 and 11
+IR_V2_LEVELS = (IR_UNIT, IR_UNIT * 2, IR_UNIT * 3, IR_UNIT * 4)
+IR_V2_LEAD_OUT = IR_UNIT * 6
+
+# FEC frames send every payload and CRC nibble as a Hamming(8,4) code byte,
+# so the decoder can fix one wrong bit in each and spot two. They are told
+# apart by their own header spaces. Data pulses off every symbol count as
+# the nearest data symbol instead of breaking the frame, and V2 levels are
+# Gray coded so a level off by one is a single bit error.
+IR_FEC_HEADER_SPACE = IR_UNIT * 10
+IR_V2_FEC_HEADER_SPACE = IR_UNIT * 2
+
+# the decoder measures each frame's unit from its header, so senders may
+# use any unit in this range. Much below 300us V2 data pulses could pass
+# for a header mark.
+IR_MIN_UNIT = 300
+IR_MAX_UNIT = 700
+# received units may drift this far outside the range, in percent
+IR_UNIT_DRIFT = 15
+_MIN_RECEIVED_UNIT = IR_MIN_UNIT * (100 - IR_UNIT_DRIFT) // 100
+_MAX_RECEIVED_UNIT = IR_MAX_UNIT * (100 + IR_UNIT_DRIFT) // 100
+_MIN_HEADER_MARK = _MIN_RECEIVED_UNIT * 8
+_MAX_HEADER_MARK = _MAX_RECEIVED_UNIT * 8
+# pulses kept so a frame hidden behind a false header can still be found.
+# Off by default as every pulse then has to be remembered, 16 pulses
+# recover most frames on a noisy stream.
+IR_DECODER_LOOKBACK = 0
+
 IR_CRC_GENERATOR = 0x1D
 
+# pulses copied out of PulseIn per decode pass, matches the default maxlen
+IR_RECEIVE_BUFFER = 256
 
-def _calculate_crc(data):
-    crc = 0
-    for data_byte in data:
-        crc ^= data_byte
+# outgoing frames wait in a fixed queue until tick() finds the channel clear
+IR_SEND_QUEUE = 4
+IR_MAX_PAYLOAD = 16
+# seconds without received pulses before the channel is considered clear
+IR_QUIET_TIME = IR_HEADER_MARK / 38000
+# seconds to wait before checking a busy channel again
+IR_BACKOFF_MIN = 0.02
+IR_BACKOFF_MAX = 0.2
+# slotted mode, every device gets a repeating slot. The slots are counted
+# from the first frame after the channel was idle for a whole cycle, which
+# every device in range hears at about the same time. A frame has to start
+# within the window, a 4 byte V1 frame takes ~52ms, the rest of the slot
+# covers devices noticing that first frame at different times.
+IR_SLOT_TIME = 0.1
+IR_SLOT_WINDOW = 0.02
+# seconds without pulses before the channel is free again, longer than any
+# gap between the pulses of a frame
+IR_SLOT_GUARD = 0.01
+
+# decoded packets are handed out from a ring of reused buffers, a packet is
+# valid until this many more have been received
+IR_PACKET_BUFFERS = 8
+
+# buckets for the histogram of each good packet's worst pulse error margin
+IR_MARGIN_BUCKETS = 5
+# strength of a frame that passed its CRC however far off its pulses were,
+# FEC frames get through with pulses past the error margin. The target
+# still lights one of its 10 pixels for it.
+IR_MIN_STRENGTH = 0.1
+
+
+def ir_slot(team, player_index, players_per_team):
+    # every team gets players_per_team consecutive slots and each of its
+    # devices one of them, so no two devices share a slot. Teams count from
+    # 0, the slot count is the number of teams times players_per_team.
+    if not 0 <= player_index < players_per_team:
+        raise RuntimeError("IR player index out of range: ", player_index)
+    return team * players_per_team + player_index
+
+
+def _build_crc_table():
+    table = bytearray(256)
+    for value in range(256):
+        crc = value
         for j in range(8):
             if crc & 0x80 != 0:
                 crc = ((crc << 1) & 0xFF) ^ IR_CRC_GENERATOR
             else:
                 crc = (crc << 1) & 0xFF
+        table[value] = crc
+    return table
+
+
+# CRC-8 of every possible byte, so each data byte costs one lookup
+_CRC_TABLE = _build_crc_table()
+
+
+def _calculate_crc(data, crc=0):
+    crc_table = _CRC_TABLE
+    for data_byte in data:
+        crc = crc_table[crc ^ data_byte]
     return crc
 
 
+# symbols a single pulse can be classified as
+IR_SYMBOL_INVALID = 0
+IR_SYMBOL_HEADER_MARK = 1
+IR_SYMBOL_HEADER_SPACE = 2
+IR_SYMBOL_ZERO = 3
+IR_SYMBOL_ONE = 4
+IR_SYMBOL_LEAD_OUT = 5
+IR_SYMBOL_V2_HEADER_SPACE = 6
+IR_SYMBOL_V2_LEAD_OUT = 7
+# V2 bit pairs, must stay last
+IR_SYMBOL_LEVEL_0 = 8
+
+# pulses are classified in steps of a quarter unit
+IR_SYMBOL_QUANTUM = IR_UNIT // 4
+
+_SYMBOL_DURATIONS = (
+    0,
+    IR_HEADER_MARK,
+    IR_HEADER_SPACE,
+    IR_ZERO,
+    IR_ONE,
+    IR_LEAD_OUT,
+    IR_V2_HEADER_SPACE,
+    IR_V2_LEAD_OUT,
+) + IR_V2_LEVELS
+
+
+def _build_symbol_table(symbols):
+    # maps pulse // IR_SYMBOL_QUANTUM to the symbol whose error margin covers
+    # that whole step, anything longer than the table is invalid
+    margin = int(IR_ERROR_MARGIN)
+    table = bytearray((max(_SYMBOL_DURATIONS) + margin) // IR_SYMBOL_QUANTUM)
+    for index in range(len(table)):
+        step_start = index * IR_SYMBOL_QUANTUM
+        step_end = step_start + IR_SYMBOL_QUANTUM
+        for symbol in symbols:
+            duration = _SYMBOL_DURATIONS[symbol]
+            if step_start >= duration - margin and step_end <= duration + margin:
+                table[index] = symbol
+    return table
+
+
+# V1 data, headers are checked against the calibrated unit instead
+_SYMBOL_TABLE = _build_symbol_table((IR_SYMBOL_ZERO, IR_SYMBOL_ONE, IR_SYMBOL_LEAD_OUT))
+# V2 data, the levels overlap the V1 symbols so they get their own table
+_V2_SYMBOL_TABLE = _build_symbol_table(
+    (IR_SYMBOL_V2_LEAD_OUT,) + tuple(range(IR_SYMBOL_LEVEL_0, IR_SYMBOL_LEVEL_0 + 4))
+)
+_SYMBOL_TABLE_LENGTH = len(_SYMBOL_TABLE)
+
+
+def _build_fec_symbol_table(symbols, lead_out):
+    # for FEC frames, a data pulse up to a unit past the longest data symbol
+    # counts as the nearest one instead of breaking the frame. Anything
+    # longer still does, so a false FEC header at a long unit can't swallow
+    # the header mark of a real frame.
+    table = _build_symbol_table(symbols + (lead_out,))
+    durations = [_SYMBOL_DURATIONS[symbol] for symbol in symbols]
+    limit = max(durations) + IR_UNIT
+    for index in range(limit // IR_SYMBOL_QUANTUM):
+        if table[index] == IR_SYMBOL_INVALID:
+            step_middle = index * IR_SYMBOL_QUANTUM + IR_SYMBOL_QUANTUM // 2
+            nearest = 0
+            for i in range(len(symbols)):
+                if abs(durations[i] - step_middle) < abs(
+                    durations[nearest] - step_middle
+                ):
+                    nearest = i
+            table[index] = symbols[nearest]
+    return table
+
+
+_FEC_SYMBOL_TABLE = _build_fec_symbol_table(
+    (IR_SYMBOL_ZERO, IR_SYMBOL_ONE), IR_SYMBOL_LEAD_OUT
+)
+_V2_FEC_SYMBOL_TABLE = _build_fec_symbol_table(
+    tuple(range(IR_SYMBOL_LEVEL_0, IR_SYMBOL_LEVEL_0 + 4)), IR_SYMBOL_V2_LEAD_OUT
+)
+
+# bit pairs of the V2 levels, plain and Gray coded for FEC frames. Both
+# work either way round, from level to bits and from bits to level.
+_LEVEL_BITS = bytes((0, 1, 2, 3))
+_FEC_LEVEL_BITS = bytes((0, 1, 3, 2))
+
+
+def _build_hamming_tables():
+    # extended Hamming(8,4), parity bits p1 p2 p3 and an overall parity bit
+    encode = bytearray(16)
+    for nibble in range(16):
+        d0 = nibble & 1
+        d1 = (nibble >> 1) & 1
+        d2 = (nibble >> 2) & 1
+        d3 = (nibble >> 3) & 1
+        code = (
+            (d0 ^ d1 ^ d3)
+            | (d0 ^ d2 ^ d3) << 1
+            | d0 << 2
+            | (d1 ^ d2 ^ d3) << 3
+            | d1 << 4
+            | d2 << 5
+            | d3 << 6
+        )
+        parity = 0
+        for bit in range(7):
+            parity ^= (code >> bit) & 1
+        encode[nibble] = code | parity << 7
+
+    # every code byte decodes to its nibble, one bit away it decodes with
+    # _HAMMING_CORRECTED set, two bits away it is uncorrectable
+    decode = bytearray([_HAMMING_UNCORRECTABLE] * 256)
+    for nibble in range(16):
+        code = encode[nibble]
+        decode[code] = nibble
+        for bit in range(8):
+            decode[code ^ (1 << bit)] = nibble | _HAMMING_CORRECTED
+    return encode, decode
+
+
+_HAMMING_CORRECTED = 0x10
+_HAMMING_UNCORRECTABLE = 0xFF
+_HAMMING_ENCODE, _HAMMING_DECODE = _build_hamming_tables()
+
+
+def _build_byte_durations(unit=IR_UNIT):
+    # 8 durations for every possible byte, most significant bit first
+    one = IR_ONE * unit // IR_UNIT
+    zero = IR_ZERO * unit // IR_UNIT
+    durations = array.array("H", [0] * (256 * 8))
+    for value in range(256):
+        for bit in range(8):
+            if value & (0x80 >> bit):
+                durations[value * 8 + bit] = one
+            else:
+                durations[value * 8 + bit] = zero
+    return durations
+
+
+def _build_v2_byte_durations(unit=IR_UNIT, pair_levels=_LEVEL_BITS):
+    # 4 durations for every possible byte, most significant bit pair first
+    levels = [level * unit // IR_UNIT for level in IR_V2_LEVELS]
+    durations = array.array("H", [0] * (256 * 4))
+    for value in range(256):
+        for pair in range(4):
+            level = pair_levels[(value >> (6 - pair * 2)) & 0x03]
+            durations[value * 4 + pair] = levels[level]
+    return durations
+
+
+_BYTE_DURATIONS = _build_byte_durations()
+_V2_BYTE_DURATIONS = _build_v2_byte_durations()
+
+
 class Infrared(object):
-    def __init__(self, ir_pulseout, ir_pulsein):
+    def __init__(
+        self, ir_pulseout, ir_pulsein, protocol=IR_PROTOCOL_V1, unit=IR_UNIT, fec=False
+    ):
+        # a PulseOut, or a function returning one that is called on the first
+        # queued send, so a session that never sends never sets it up
         self._ir_pulseout = ir_pulseout
         self._ir_pulsein = ir_pulsein
+        self._encoder = IREncoder(protocol, unit, fec)
         self._decoder = IRDecoder()
+        self._pulses = array.array("H", [0] * IR_RECEIVE_BUFFER)
+        self._pulses_view = memoryview(self._pulses)
+        # copied pulses not decoded yet, left over when the packet ring is full
+        self._pulses_start = 0
+        self._pulses_end = 0
+        self._received = []
+
+        self._send_queue = [bytearray(IR_MAX_PAYLOAD) for i in range(IR_SEND_QUEUE)]
+        self._send_views = [memoryview(payload) for payload in self._send_queue]
+        self._send_lengths = bytearray(IR_SEND_QUEUE)
+        self._send_head = 0
+        self._send_count = 0
+        self._send_after = 0
+        self._last_traffic = 0
+        self._wait_start = None
+        self._slot_count = 0
+        self._slot_start = 0
+        self._slot_cycle = 0
+        self._slot_epoch = 0
+        self.reset_stats()
+
+    @property
+    def send_pending(self):
+        return self._send_count
+
+    def reset_stats(self):
+        self._decoder.reset_stats()
+        self._frames_sent = 0
+        self._send_drops = 0
+        self._backoffs = 0
+        self._traffic_wait_time = 0
+        self._slot_waits = 0
+
+    def snapshot(self):
+        stats = self._decoder.snapshot()
+        stats["frames_sent"] = self._frames_sent
+        stats["send_drops"] = self._send_drops
+        stats["backoffs"] = self._backoffs
+        stats["traffic_wait_time"] = self._traffic_wait_time
+        stats["slot_waits"] = self._slot_waits
+        return stats
+
+    def use_slots(self, slot, slot_count, slot_time=IR_SLOT_TIME):
+        # holds frames until this device's slot, a slot_count of 0 sends as
+        # soon as the channel is clear
+        if slot_count > 0 and not 0 <= slot < slot_count:
+            raise RuntimeError("IR slot out of range: ", slot, slot_count)
+        self._slot_count = slot_count
+        self._slot_start = slot * slot_time
+        self._slot_cycle = slot_count * slot_time
 
     def send(self, data):
-        self._wait_for_traffic()
+        # queues the frame, it is transmitted by tick() once the channel is clear
+        if len(data) > IR_MAX_PAYLOAD:
+            raise RuntimeError("IR payload too long: ", len(data))
+        if self._send_count == IR_SEND_QUEUE:
+            print("IR send queue full, dropping: ", data)
+            self._send_drops += 1
+            return False
 
         print("IR Sending: ", data)
-        # length = header + (data * 8 bits per byte) + crc bits + lead out
-        durations = array.array("H", [0] * (2 + len(data) * 8 + 8 + 1))
-        durations[0] = IR_HEADER_MARK
-        durations[1] = IR_HEADER_SPACE
-        durations[-1] = IR_LEAD_OUT
+        index = (self._send_head + self._send_count) % IR_SEND_QUEUE
+        self._send_queue[index][: len(data)] = data
+        self._send_lengths[index] = len(data)
+        self._send_count += 1
+        return True
 
-        duration_index = 2
-        for data_byte in data:
-            self._encode_byte(durations, duration_index, data_byte)
-            duration_index += 8
+    def _heard_traffic(self, now):
+        if now - self._last_traffic > self._slot_cycle:
+            # first traffic after an idle cycle, the slots restart with it
+            self._slot_epoch = now
+        self._last_traffic = now
 
-        crc = _calculate_crc(data)
-        # print("CRC: ", bin(crc))
-        self._encode_byte(durations, duration_index, crc)
+    def tick(self):
+        if self._send_count == 0:
+            return
+
+        now = time.monotonic()
+        if len(self._ir_pulsein) > 0:
+            self._heard_traffic(now)
+        if now < self._send_after:
+            return
+        if self._slot_count > 0:
+            # the slots keep frames apart, so there is no backoff
+            offset = (now - self._slot_epoch - self._slot_start) % self._slot_cycle
+            if now - self._last_traffic < IR_SLOT_GUARD or offset >= IR_SLOT_WINDOW:
+                if self._wait_start is None:
+                    self._slot_waits += 1
+                    self._wait_start = now
+                return
+        elif now - self._last_traffic < IR_QUIET_TIME:
+            # someone else is transmitting, check again after a random backoff
+            # so devices waiting on the same traffic don't all send at once
+            self._send_after = now + random.uniform(IR_BACKOFF_MIN, IR_BACKOFF_MAX)
+            self._backoffs += 1
+            if self._wait_start is None:
+                self._wait_start = now
+            return
+
+        if self._wait_start is not None:
+            self._traffic_wait_time += now - self._wait_start
+            self._wait_start = None
+
+        index = self._send_head
+        durations = self._encoder.encode(
+            self._send_views[index][: self._send_lengths[index]]
+        )
+        self._send_head = (index + 1) % IR_SEND_QUEUE
+        self._send_count -= 1
+        self._frames_sent += 1
+
+        if self._slot_count > 0:
+            self._heard_traffic(now)
+
+        if callable(self._ir_pulseout):
+            self._ir_pulseout = self._ir_pulseout()
 
         # print("Durations: ", durations)
         self._ir_pulseout.send(durations)
         # print("Sent")
 
-    def _wait_for_traffic(self):
-        while True:
-            last_len = len(self._ir_pulsein)
-            time.sleep(IR_HEADER_MARK / 38000)
-            if last_len == len(self._ir_pulsein):
-                break
-            else:
-                print("Waiting in IR traffic ", last_len)
-
     def receive(self):
+        packet = self._decoder.recovered()
+        if packet is not None:
+            return packet
+
+        while self._pulses_start < self._pulses_end:
+            pulse = self._pulses[self._pulses_start]
+            self._pulses_start += 1
+            packet = self._decoder.decode(pulse)
+            if packet is not None:
+                return packet
+
         if len(self._ir_pulsein) == 0:
             return
 
+        self._heard_traffic(time.monotonic())
         while len(self._ir_pulsein) > 0:
             packet = self._decoder.decode(self._ir_pulsein.popleft())
             if packet is not None:
                 return packet
 
-    def _encode_byte(self, durations, duration_index, value):
-        for i in range(8):
-            if (value & 0x80) > 0:
-                durations[duration_index] = IR_ONE
+    def receive_all(self):
+        # the returned list and its packets are reused, see IR_PACKET_BUFFERS
+        packets = self._received
+        packets.clear()
+        # frames a resync found that didn't fit into the last call
+        packet = self._decoder.recovered()
+        while packet is not None:
+            packets.append(packet)
+            if len(packets) == IR_PACKET_BUFFERS:
+                return packets
+            packet = self._decoder.recovered()
+        ir_pulsein = self._ir_pulsein
+        pulses = self._pulses
+        if len(ir_pulsein) > 0:
+            self._heard_traffic(time.monotonic())
+        while len(packets) < IR_PACKET_BUFFERS:
+            if self._pulses_start == self._pulses_end:
+                if len(ir_pulsein) == 0:
+                    break
+                # copy the pending pulses out first so PulseIn can keep filling
+                count = min(len(ir_pulsein), len(pulses))
+                popleft = ir_pulsein.popleft
+                for i in range(count):
+                    pulses[i] = popleft()
+                self._pulses_start = 0
+                self._pulses_end = count
+            self._pulses_start += self._decoder.decode_many(
+                self._pulses_view[self._pulses_start : self._pulses_end],
+                packets,
+                IR_PACKET_BUFFERS - len(packets),
+            )
+        return packets
+
+
+class IREncoder(object):
+    def __init__(self, protocol=IR_PROTOCOL_V1, unit=IR_UNIT, fec=False):
+        if unit < IR_MIN_UNIT or unit > IR_MAX_UNIT:
+            raise RuntimeError("IR unit out of range: ", unit)
+        # frame buffers are reused, keyed by payload length
+        self._frames = {}
+        self._header_mark = IR_HEADER_MARK * unit // IR_UNIT
+        self._fec = fec
+        if fec:
+            # code bytes of the payload and CRC nibbles
+            self._code_buffer = bytearray((IR_MAX_PAYLOAD + 1) * 2)
+            self._code_view = memoryview(self._code_buffer)
+        if protocol == IR_PROTOCOL_V2:
+            # a shorter unit or FEC needs its own 2KB table
+            if fec:
+                byte_durations = _build_v2_byte_durations(unit, _FEC_LEVEL_BITS)
+            elif unit == IR_UNIT:
+                byte_durations = _V2_BYTE_DURATIONS
+            else:
+                byte_durations = _build_v2_byte_durations(unit)
+            self._byte_durations = memoryview(byte_durations)
+            self._durations_per_byte = 4
+            header_space = IR_V2_FEC_HEADER_SPACE if fec else IR_V2_HEADER_SPACE
+            self._header_space = header_space * unit // IR_UNIT
+            self._lead_out = IR_V2_LEAD_OUT * unit // IR_UNIT
+        else:
+            # a shorter unit needs its own 4KB table
+            if unit == IR_UNIT:
+                byte_durations = _BYTE_DURATIONS
             else:
-                durations[duration_index] = IR_ZERO
-            value <<= 1
-            duration_index += 1
+                byte_durations = _build_byte_durations(unit)
+            self._byte_durations = memoryview(byte_durations)
+            self._durations_per_byte = 8
+            header_space = IR_FEC_HEADER_SPACE if fec else IR_HEADER_SPACE
+            self._header_space = header_space * unit // IR_UNIT
+            self._lead_out = IR_LEAD_OUT * unit // IR_UNIT
 
+    def encode(self, data):
+        # the returned durations are only valid until the next encode of the
+        # same length
+        crc = _calculate_crc(data)
+        if self._fec:
+            return self._encode_bytes(self._fec_encode(data, crc), None)
+        return self._encode_bytes(data, crc)
 
-class IRDecoder(object):
+    def _fec_encode(self, data, crc):
+        code_buffer = self._code_buffer
+        hamming_encode = _HAMMING_ENCODE
+        code_index = 0
+        for data_byte in data:
+            code_buffer[code_index] = hamming_encode[data_byte >> 4]
+            code_buffer[code_index + 1] = hamming_encode[data_byte & 0x0F]
+            code_index += 2
+        code_buffer[code_index] = hamming_encode[crc >> 4]
+        code_buffer[code_index + 1] = hamming_encode[crc & 0x0F]
+        return self._code_view[: code_index + 2]
+
+    def _encode_bytes(self, data, crc):
+        # the CRC is appended unless it is already in data
+        length = len(data) if crc is None else len(data) + 1
+        durations, durations_view = self._frame(length)
+        byte_durations = self._byte_durations
+        count = self._durations_per_byte
+
+        duration_index = 2
+        for data_byte in data:
+            byte_index = data_byte * count
+            durations_view[duration_index : duration_index + count] = byte_durations[
+                byte_index : byte_index + count
+            ]
+            duration_index += count
+
+        if crc is not None:
+            byte_index = crc * count
+            durations_view[duration_index : duration_index + count] = byte_durations[
+                byte_index : byte_index + count
+            ]
+        return durations
+
+    def _frame(self, length):
+        frame = self._frames.get(length)
+        if frame is None:
+            # length = header + data and crc durations + lead out
+            count = self._durations_per_byte
+            durations = array.array("H", [0] * (2 + length * count + 1))
+            durations[0] = self._header_mark
+            durations[1] = self._header_space
+            durations[-1] = self._lead_out
+            frame = (durations, memoryview(durations))
+            self._frames[length] = frame
+        return frame
+
+
+class IRPacket(object):
+    # A decoded frame. data is a memoryview into a buffer the decoder reuses,
+    # copy it with bytes(packet.data) to keep it past IR_PACKET_BUFFERS more
+    # packets.
     def __init__(self):
+        self._buffer = bytearray(IR_MAX_PAYLOAD + 1)
+        self._view = memoryview(self._buffer)
+        # views of every payload length, created once when first needed
+        self._data_views = [None] * len(self._buffer)
+        self.data = self._view[:0]
+        self.crc = 0
+        self.strength = 0
+        # bits fixed by the Hamming code of an FEC frame
+        self.corrected = 0
+        self.fec = False
+
+    def _set(self, length, strength, corrected, fec):
+        data = self._data_views[length]
+        if data is None:
+            data = self._view[:length]
+            self._data_views[length] = data
+        self.data = data
+        self.crc = self._buffer[length]
+        self.strength = strength
+        self.corrected = corrected
+        self.fec = fec
+
+
+class IRDecoder(object):
+    def __init__(self, lookback=IR_DECODER_LOOKBACK):
+        # with a lookback, the pulses of a frame that turns out to be corrupt
+        # are scanned again for the header of a frame that started inside it
+        self._history = array.array("H", [0] * lookback) if lookback > 0 else None
+        self._history_scratch = (
+            array.array("H", [0] * lookback) if lookback > 0 else None
+        )
+        self._history_count = 0
+        self._replaying = False
+        self._packet_ring = [IRPacket() for i in range(IR_PACKET_BUFFERS)]
+        self._packet_index = 0
+        self._received_buffer = self._packet_ring[0]._buffer
+        # frames a resync found besides the one it returned, oldest first
+        self._recovered = []
         self._reset_decode()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._pulses = 0
+        self._header_syncs = 0
+        self._resets = 0
+        self._resyncs = 0
+        self._crc_failures = 0
+        self._fec_failures = 0
+        self._false_fec_syncs = 0
+        self._corrected_bits = 0
+        self._packets = 0
+        self._bytes = 0
+        self._margin_histogram = array.array("L", [0] * IR_MARGIN_BUCKETS)
+
+    def snapshot(self):
+        return {
+            "pulses": self._pulses,
+            "header_syncs": self._header_syncs,
+            "resets": self._resets,
+            "resyncs": self._resyncs,
+            "crc_failures": self._crc_failures,
+            "fec_failures": self._fec_failures,
+            "false_fec_syncs": self._false_fec_syncs,
+            "corrected_bits": self._corrected_bits,
+            "packets": self._packets,
+            "bytes": self._bytes,
+            "margin_histogram": tuple(self._margin_histogram),
+        }
 
     def decode(self, pulse):
-        # print("Pulse: ", pulse)
+        self._pulses += 1
+        recovered = self._recovered
+        if not recovered:
+            return self._decode(pulse)
+        # frames found by a resync are handed out first, one per call
+        waiting = len(recovered)
+        packet = self._decode(pulse)
+        if packet is not None:
+            recovered.insert(waiting, packet)
+        return recovered.pop(0)
 
-        # discard pulses until we get the first header pulse
+    def recovered(self):
+        # returns the oldest frame a resync found that wasn't handed out yet
+        if self._recovered:
+            return self._recovered.pop(0)
+        return None
+
+    def _decode(self, pulse):
+        # print("Pulse: ", pulse)
+        # discard pulses until we get something that can be a header mark
         if self._received_headers == 0:
-            if self._check_pulse(pulse, IR_HEADER_MARK):
-                self._received_headers = 1
-        elif self._received_headers == 1:
-            if self._check_pulse(pulse, IR_HEADER_SPACE):
-                self._received_headers = 2
-                self._reset_data()
-            else:
-                self._reset_decode()
-        elif self._received_headers == 2:
-            if self._check_pulse(pulse, IR_ONE):
-                self._write_bit(1)
-            elif self._check_pulse(pulse, IR_ZERO):
-                self._write_bit(0)
-            elif self._check_pulse(pulse, IR_LEAD_OUT):
-                received_crc = self._received_data[-1]
-                received_data = self._received_data[: len(self._received_data) - 1]
-                calculated_crc = _calculate_crc(received_data)
-                pulse_error_margin = self._max_error_margin
-                self._reset_decode()
-                if received_crc == calculated_crc:
-                    error_ratio = pulse_error_margin / IR_ERROR_MARGIN
-                    signal_strength = min(1, 1.3 - error_ratio)
-                    return received_data, signal_strength
+            if pulse < _MIN_HEADER_MARK or pulse > _MAX_HEADER_MARK:
+                return
+            if self._history is not None and not self._replaying:
+                self._history_count = 0
+                self._remember(pulse)
+            self._header_mark = pulse
+            self._received_headers = 1
+            return
+
+        if self._history is not None and not self._replaying:
+            self._remember(pulse)
+
+        if self._received_headers == 1:
+            return self._calibrate(pulse)
+
+        # scale the pulse to IR_UNIT so the symbol tables fit every sender
+        scaled = pulse * IR_UNIT // self._unit
+        index = scaled // IR_SYMBOL_QUANTUM
+        if index < _SYMBOL_TABLE_LENGTH:
+            symbol = self._symbol_table[index]
+        else:
+            symbol = IR_SYMBOL_INVALID
+
+        if symbol == IR_SYMBOL_INVALID:
+            # unknown pulse, packet is corrupt so reset
+            return self._resync(pulse)
+
+        margin = abs(scaled - _SYMBOL_DURATIONS[symbol])
+        if margin > self._max_error_margin:
+            self._max_error_margin = margin
+        if margin > IR_ERROR_MARGIN:
+            self._wide_pulses += 1
+        else:
+            self._wide_pulses -= 1
+
+        # a write returns what a resync found when an FEC header turns out
+        # to be false
+        if symbol == IR_SYMBOL_ONE:
+            return self._write_bits(1, 1, pulse)
+        if symbol == IR_SYMBOL_ZERO:
+            return self._write_bits(0, 1, pulse)
+        if symbol >= IR_SYMBOL_LEVEL_0:
+            bits = self._level_bits[symbol - IR_SYMBOL_LEVEL_0]
+            return self._write_bits(bits, 2, pulse)
+        return self._end_packet(pulse)
+
+    def _calibrate(self, header_space):
+        # the space to mark ratio selects the protocol, V1 is 6:8 and V2 is
+        # 4:8, their FEC frames 10:8 and 2:8. The whole header gives the
+        # sender's unit, unless both pulses are within the error margin of
+        # IR_UNIT. A unit measured from two jittered pulses would scale every
+        # data pulse by its error, most of all the ONE and the lead out.
+        header_mark = self._header_mark
+        space = header_space * 8
+        if header_mark * 5 <= space <= header_mark * 7:
+            units = 8 + 6
+            self._symbol_table = _SYMBOL_TABLE
+        elif header_mark * 3 <= space < header_mark * 5:
+            units = 8 + 4
+            self._symbol_table = _V2_SYMBOL_TABLE
+        elif header_mark * 7 < space <= header_mark * 11:
+            units = 8 + 10
+            self._symbol_table = _FEC_SYMBOL_TABLE
+            self._fec = True
+        elif header_mark <= space < header_mark * 3:
+            units = 8 + 2
+            self._symbol_table = _V2_FEC_SYMBOL_TABLE
+            self._level_bits = _FEC_LEVEL_BITS
+            self._fec = True
+        else:
+            return self._resync(header_space)
+
+        if (
+            abs(header_mark - IR_HEADER_MARK) <= IR_ERROR_MARGIN
+            and abs(header_space - (units - 8) * IR_UNIT) <= IR_ERROR_MARGIN
+        ):
+            unit = IR_UNIT
+        else:
+            unit = (header_mark + header_space) // units
+        if unit < _MIN_RECEIVED_UNIT or unit > _MAX_RECEIVED_UNIT:
+            return self._resync(header_space)
+        self._unit = unit
+        self._received_headers = 2
+        self._header_syncs += 1
+        self._reset_data()
+
+        # how far the mark and space split is from the calibrated unit
+        margin = abs(header_mark * IR_UNIT // unit - IR_HEADER_MARK)
+        if margin > self._max_error_margin:
+            self._max_error_margin = margin
+
+    def _resync(self, pulse):
+        self._resets += 1
+        self._reset_decode()
+        if self._history is None or self._replaying:
+            # the pulse that broke the frame may be the header mark of the
+            # next one, so the next frame isn't lost along with this one
+            packet = self._decode(pulse)
+        else:
+            packet = self._replay()
+        if self._received_headers > 0:
+            self._resyncs += 1
+        return packet
+
+    def _replay(self):
+        # decodes the pulses of the broken frame again, skipping the header
+        # mark that started it, the pulse that broke it comes last. When a
+        # frame found on the way breaks too, the replay starts again after
+        # that frame's header mark.
+        history = self._history
+        length = len(history)
+        count = self._history_count
+        packet = None
+        self._replaying = True
+        index = max(1, count - length)
+        frame_start = index
+        while index < count:
+            resets = self._resets
+            replayed = self._decode(history[index % length])
+            if replayed is not None:
+                if packet is None:
+                    packet = replayed
                 else:
-                    print("CRC mismatch: ", bin(received_crc), bin(calculated_crc))
-            else:
-                # unknown pulse, packet is corrupt so reset
+                    self._recovered.append(replayed)
+            if self._resets != resets and frame_start + 1 < index:
                 self._reset_decode()
+                index = frame_start + 1
+                frame_start = index
+                continue
+            if self._received_headers == 0:
+                frame_start = index + 1
+            elif self._received_headers == 1:
+                frame_start = index
+            index += 1
+        self._replaying = False
+
+        # keep only the pulses of the frame still being received
+        scratch = self._history_scratch
+        kept = count - frame_start
+        for i in range(kept):
+            scratch[i] = history[(frame_start + i) % length]
+        self._history = scratch
+        self._history_scratch = history
+        self._history_count = kept
+        return packet
+
+    def _remember(self, pulse):
+        self._history[self._history_count % len(self._history)] = pulse
+        self._history_count += 1
+
+    def _end_packet(self, lead_out):
+        length = self._received_length
+        if length == 0 or length > len(self._received_buffer) or self._high_nibble >= 0:
+            # lead out without a CRC byte, too long for a packet or half a
+            # byte of FEC codes, corrupt. A header mark can look like a lead
+            # out at a false unit.
+            return self._resync(lead_out)
+        if self._fec_failed:
+            self._fec_failures += 1
+            self._reset_decode()
+            print("FEC uncorrectable")
+            return
+        received_crc = self._received_buffer[length - 1]
+        calculated_crc = self._data_crc
+        pulse_error_margin = self._max_error_margin
+        corrected = self._frame_corrections
+        fec = self._fec
+        self._reset_decode()
+        if received_crc == calculated_crc:
+            error_ratio = pulse_error_margin / IR_ERROR_MARGIN
+            signal_strength = max(IR_MIN_STRENGTH, min(1, 1.3 - error_ratio))
+            self._corrected_bits += corrected
+            self._packets += 1
+            self._bytes += length - 1
+            bucket = int(error_ratio * IR_MARGIN_BUCKETS)
+            self._margin_histogram[min(bucket, IR_MARGIN_BUCKETS - 1)] += 1
+
+            packet = self._packet_ring[self._packet_index]
+            packet._set(length - 1, signal_strength, corrected, fec)
+            self._packet_index = (self._packet_index + 1) % IR_PACKET_BUFFERS
+            self._received_buffer = self._packet_ring[self._packet_index]._buffer
+            return packet
+        else:
+            self._crc_failures += 1
+            print("CRC mismatch: ", bin(received_crc), bin(calculated_crc))
+
+    def decode_many(self, pulses, packets, limit=IR_PACKET_BUFFERS):
+        # decodes until limit packets were added so none of them is reused,
+        # returns how many pulses were consumed
+        decode = self._decode
+        recovered = self._recovered
+        consumed = 0
+        added = 0
+        while recovered and added < limit:
+            packets.append(recovered.pop(0))
+            added += 1
+        if added == limit:
+            return 0
+        for pulse in pulses:
+            consumed += 1
+            packet = decode(pulse)
+            if packet is not None:
+                packets.append(packet)
+                added += 1
+                # a resync can find more than one frame
+                while recovered and added < limit:
+                    packets.append(recovered.pop(0))
+                    added += 1
+                if added == limit:
+                    break
+        self._pulses += consumed
+        return consumed
 
     def _reset_decode(self):
         self._received_headers = 0
+        self._symbol_table = _SYMBOL_TABLE
+        self._level_bits = _LEVEL_BITS
+        self._fec = False
+        self._header_mark = 0
+        self._unit = IR_UNIT
         self._max_error_margin = 0
-        self._received_data = None
+        self._received_length = 0
 
     def _reset_data(self):
-        self._received_data = bytearray()
+        # pulses past the error margin less those within it
+        self._wide_pulses = 0
+        self._received_length = 0
+        # running CRC of all received bytes, and of all but the last one
+        self._crc = 0
+        self._data_crc = 0
+        # first nibble of an FEC byte until its second code byte arrives
+        self._high_nibble = -1
+        self._frame_corrections = 0
+        self._fec_failed = False
         self._reset_bits()
 
     def _reset_bits(self):
         self._received_byte = 0
         self._received_bit_index = 7
 
-    def _check_pulse(self, received, expected):
-        margin = abs(received - expected)
-        match = margin < IR_ERROR_MARGIN
-        if match:
-            self._max_error_margin = max(self._max_error_margin, margin)
-        return match
-
-    def _write_bit(self, bit):
-        if bit == 1:
-            self._received_byte |= 1 << self._received_bit_index
-        self._received_bit_index -= 1
+    def _write_bits(self, bits, count, pulse):
+        self._received_bit_index -= count
+        self._received_byte |= bits << (self._received_bit_index + 1)
         if self._received_bit_index < 0:
             # print("Received Byte: ", bin(self._received_byte))
-            self._received_data.append(self._received_byte)
+            received_byte = self._received_byte
             self._reset_bits()
+            if self._fec:
+                return self._write_code_byte(received_byte, pulse)
+            self._write_byte(received_byte)
         # print("Bit Update: ", bin(self._received_byte), self._received_bit_index)
+
+    def _write_byte(self, received_byte):
+        if self._received_length < len(self._received_buffer):
+            self._received_buffer[self._received_length] = received_byte
+        self._received_length += 1
+        self._data_crc = self._crc
+        self._crc = _CRC_TABLE[self._crc ^ received_byte]
+
+    def _false_fec_sync(self, nibble):
+        # the header ratio alone lets noise pass for an FEC header, which
+        # would then take the frames behind it as data. In the first byte of
+        # a real frame every code byte can be corrected, and when one had to
+        # be most of its pulses still fit their symbols.
+        if nibble == _HAMMING_UNCORRECTABLE:
+            return True
+        if nibble < _HAMMING_CORRECTED and self._frame_corrections == 0:
+            return False
+        return self._wide_pulses >= 0
+
+    def _write_code_byte(self, code, pulse):
+        nibble = _HAMMING_DECODE[code]
+        if self._received_length == 0 and self._false_fec_sync(nibble):
+            self._false_fec_syncs += 1
+            return self._resync(pulse)
+        if nibble == _HAMMING_UNCORRECTABLE:
+            # the rest of the frame is still read so it ends at its lead out
+            self._fec_failed = True
+            nibble = 0
+        elif nibble & _HAMMING_CORRECTED:
+            self._frame_corrections += 1
+            nibble &= 0x0F
+
+        if self._high_nibble < 0:
+            self._high_nibble = nibble
+        else:
+            self._write_byte(self._high_nibble << 4 | nibble)
+            self._high_nibble = -1
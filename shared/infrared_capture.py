@@ -0,0 +1,186 @@
+import array
+import struct
+import time
+
+from infrared import IR_UNIT, IR_RECEIVE_BUFFER
+
+# Capture file layout, all little-endian:
+#   header: magic, version, reserved byte, IR_UNIT of the recording device
+#   bursts: milliseconds since the recording started, pulse count, then one
+#           unsigned 16 bit duration per pulse
+IR_CAPTURE_MAGIC = b"QIRC"
+IR_CAPTURE_VERSION = 1
+_HEADER_FORMAT = "<4sBBH"
+_BURST_FORMAT = "<IH"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_BURST_SIZE = struct.calcsize(_BURST_FORMAT)
+
+
+class CaptureRecorder(object):
+    # Writes received pulses to a capture file, buffered so flash is written
+    # in chunk_size blocks instead of once per burst.
+    def __init__(self, file, chunk_size=512):
+        self._file = file
+        self._chunk = bytearray(max(chunk_size, _HEADER_SIZE + _BURST_SIZE + 2))
+        self._chunk_view = memoryview(self._chunk)
+        self._chunk_length = 0
+        self._pulses = array.array("H", [0] * IR_RECEIVE_BUFFER)
+        self._pulses_view = memoryview(self._pulses)
+        self._start_time = time.monotonic()
+        self.bursts = 0
+        self.pulses = 0
+
+        struct.pack_into(
+            _HEADER_FORMAT,
+            self._chunk,
+            0,
+            IR_CAPTURE_MAGIC,
+            IR_CAPTURE_VERSION,
+            0,
+            IR_UNIT,
+        )
+        self._chunk_length = _HEADER_SIZE
+
+    def read(self, ir_pulsein):
+        # drains PulseIn, records the pulses as one burst and returns them so
+        # they can still be decoded, valid until the next read
+        count = min(len(ir_pulsein), len(self._pulses))
+        if count == 0:
+            return self._pulses_view[:0]
+        pulses = self._pulses
+        popleft = ir_pulsein.popleft
+        for i in range(count):
+            pulses[i] = popleft()
+        received = self._pulses_view[:count]
+        self.record(received)
+        return received
+
+    def record(self, pulses, timestamp=None):
+        if len(pulses) == 0:
+            return
+        if timestamp is None:
+            timestamp = int((time.monotonic() - self._start_time) * 1000)
+
+        # long bursts are split so a record always fits in one chunk
+        chunk_pulses = (len(self._chunk) - _BURST_SIZE) // 2
+        for start in range(0, len(pulses), chunk_pulses):
+            count = min(len(pulses) - start, chunk_pulses)
+            if self._chunk_length + _BURST_SIZE + count * 2 > len(self._chunk):
+                self.flush()
+            struct.pack_into(
+                _BURST_FORMAT, self._chunk, self._chunk_length, timestamp, count
+            )
+            offset = self._chunk_length + _BURST_SIZE
+            for i in range(start, start + count):
+                struct.pack_into("<H", self._chunk, offset, pulses[i])
+                offset += 2
+            self._chunk_length = offset
+            self.bursts += 1
+            self.pulses += count
+
+    def flush(self):
+        if self._chunk_length > 0:
+            self._file.write(self._chunk_view[: self._chunk_length])
+            self._chunk_length = 0
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class CaptureReplay(object):
+    # Plays a capture file back through the same interface as PulseIn. By
+    # default every pulse is available at once so decoders run at CPU speed,
+    # with realtime=True bursts are released at their recorded times.
+    def __init__(self, file, realtime=False):
+        data = file.read()
+        magic, version, reserved, unit = struct.unpack_from(_HEADER_FORMAT, data, 0)
+        if magic != IR_CAPTURE_MAGIC or version != IR_CAPTURE_VERSION:
+            raise RuntimeError("Unknown IR capture: ", magic, version)
+        self.unit = unit
+
+        durations = bytearray()
+        burst_ends = []
+        timestamps = []
+        offset = _HEADER_SIZE
+        while offset + _BURST_SIZE <= len(data):
+            timestamp, count = struct.unpack_from(_BURST_FORMAT, data, offset)
+            offset += _BURST_SIZE
+            if offset + count * 2 > len(data):
+                # the recorder was cut off mid-write, keep the whole pulses
+                count = (len(data) - offset) // 2
+                print("IR capture truncated, last burst has pulses: ", count)
+            durations += data[offset : offset + count * 2]
+            offset += count * 2
+            burst_ends.append(len(durations) // 2)
+            timestamps.append(timestamp)
+
+        # both the devices and the hosts we replay on are little-endian
+        self._pulses = array.array("H", durations)
+        self._burst_ends = burst_ends
+        self._timestamps = timestamps
+        self._realtime = realtime
+        self._paused = False
+        self._index = 0
+        self._next_burst = 0
+        self._available = 0
+        self._start_time = time.monotonic()
+        if not realtime:
+            self._next_burst = len(burst_ends)
+            self._available = len(self._pulses)
+
+    @property
+    def bursts(self):
+        return len(self._burst_ends)
+
+    @property
+    def maxlen(self):
+        return len(self._pulses)
+
+    @property
+    def done(self):
+        return self._next_burst == len(self._burst_ends) and self._index == len(
+            self._pulses
+        )
+
+    def _release(self):
+        elapsed = int((time.monotonic() - self._start_time) * 1000)
+        while (
+            self._next_burst < len(self._burst_ends)
+            and self._timestamps[self._next_burst] <= elapsed
+        ):
+            end = self._burst_ends[self._next_burst]
+            self._next_burst += 1
+            if self._paused:
+                # the hardware misses pulses while paused
+                self._index = end
+            self._available = end
+
+    def __len__(self):
+        if self._realtime:
+            self._release()
+        return self._available - self._index
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= self._available - self._index:
+            raise IndexError("index out of range")
+        return self._pulses[self._index + index]
+
+    def popleft(self):
+        if self._index >= self._available:
+            raise IndexError("pop from empty PulseIn")
+        pulse = self._pulses[self._index]
+        self._index += 1
+        return pulse
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self, trigger_duration=0):
+        self._paused = False
+
+    def clear(self):
+        self._index = self._available
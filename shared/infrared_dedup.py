@@ -0,0 +1,68 @@
+import array
+import time
+
+from infrared import IR_MAX_PAYLOAD
+
+# seconds a payload is remembered, reflections arrive within a few ms but a
+# player can't cast the same spell again this quickly
+IR_DUPLICATE_WINDOW = 0.1
+# slots in the table, a packet's slot is picked by its CRC
+IR_DUPLICATE_TABLE = 16
+
+
+class IRDuplicateFilter(object):
+    # Drops copies of a packet received again within the window. Each CRC
+    # maps to one slot, so a check is one slot lookup, and a different
+    # payload landing in a used slot evicts the older entry.
+    def __init__(self, window=IR_DUPLICATE_WINDOW, size=IR_DUPLICATE_TABLE):
+        # times are whole milliseconds, a float32 of the monotonic time is
+        # off by more than the window after a few days
+        self._window = int(window * 1000)
+        self._times = array.array("L", [0] * size)
+        self._lengths = bytearray(size)
+        self._used = bytearray(size)
+        self._payloads = [bytearray(IR_MAX_PAYLOAD) for i in range(size)]
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._duplicates = 0
+        self._evictions = 0
+
+    def snapshot(self):
+        return {
+            "duplicates": self._duplicates,
+            "evictions": self._evictions,
+        }
+
+    def is_duplicate(self, packet, now=None):
+        # remembers the packet when it is new, now is in seconds
+        if now is None:
+            now = time.monotonic_ns() // 1000000
+        else:
+            now = int(now * 1000)
+        data = packet.data
+        length = len(data)
+        slot = packet.crc % len(self._times)
+        payload = self._payloads[slot]
+
+        if self._used[slot] and now - self._times[slot] <= self._window:
+            if self._lengths[slot] == length and self._same(payload, data, length):
+                self._duplicates += 1
+                return True
+            self._evictions += 1
+
+        payload[:length] = data
+        self._lengths[slot] = length
+        self._times[slot] = now
+        self._used[slot] = 1
+        return False
+
+    def _same(self, payload, data, length):
+        for i in range(length):
+            if payload[i] != data[i]:
+                return False
+        return True
+
+    def clear(self):
+        for slot in range(len(self._used)):
+            self._used[slot] = 0
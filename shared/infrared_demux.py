@@ -0,0 +1,84 @@
+import array
+import time
+
+from infrared import IR_RECEIVE_BUFFER
+
+# seconds without pulses before a protocol is told its burst has ended
+IR_DEMUX_IDLE_TIME = 0.05
+
+
+class PulseBurstDecoder(object):
+    # Collects raw bursts such as NERF Lazer Tag shots. A burst ends at a
+    # pulse longer than max_pulse, or when the demux sees the channel go idle.
+    def __init__(self, max_pulse=10000, max_length=64, min_length=2):
+        self._max_pulse = max_pulse
+        self._min_length = min_length
+        self._burst = array.array("H", [0] * max_length)
+        self._burst_view = memoryview(self._burst)
+        self._length = 0
+
+    def decode(self, pulse):
+        if pulse > self._max_pulse:
+            return self.flush()
+        if self._length < len(self._burst):
+            self._burst[self._length] = pulse
+            self._length += 1
+
+    def flush(self):
+        # the returned burst is only valid until the next decode
+        length = self._length
+        self._length = 0
+        if length < self._min_length:
+            return None
+        return self._burst_view[:length]
+
+
+class InfraredDemux(object):
+    # Reads PulseIn once per update and feeds the same pulses to every
+    # registered protocol. Call Infrared.tick() before update() so carrier
+    # sense still sees the pulses before they are drained.
+    def __init__(self, ir_pulsein):
+        self._ir_pulsein = ir_pulsein
+        self._protocols = []
+        self._pulses = array.array("H", [0] * IR_RECEIVE_BUFFER)
+        self._pulses_view = memoryview(self._pulses)
+        self._last_pulse_time = 0
+        self._idle = True
+
+    def register(self, decoder, callback):
+        # decoder.decode(pulse) returns a packet or None, decoders with a
+        # flush() method are also flushed when the channel goes idle
+        flush = getattr(decoder, "flush", None)
+        self._protocols.append((decoder, callback, flush))
+
+    def update(self):
+        ir_pulsein = self._ir_pulsein
+        if len(ir_pulsein) == 0:
+            if (
+                not self._idle
+                and time.monotonic() - self._last_pulse_time > IR_DEMUX_IDLE_TIME
+            ):
+                self._idle = True
+                for decoder, callback, flush in self._protocols:
+                    if flush is not None:
+                        packet = flush()
+                        if packet is not None:
+                            callback(packet)
+            return
+
+        self._last_pulse_time = time.monotonic()
+        self._idle = False
+        pulses = self._pulses
+        while len(ir_pulsein) > 0:
+            count = min(len(ir_pulsein), len(pulses))
+            popleft = ir_pulsein.popleft
+            for i in range(count):
+                pulses[i] = popleft()
+
+            received = self._pulses_view[:count]
+            for decoder, callback, flush in self._protocols:
+                decode = decoder.decode
+                for pulse in received:
+                    packet = decode(pulse)
+                    if packet is not None:
+                        callback(packet)
@@ -0,0 +1,153 @@
+import array
+import time
+
+# pulses held in RAM between PulseIn and the decoder
+IR_DRAIN_BUFFER = 512
+# fraction of PulseIn maxlen that counts as a near overflow
+IR_DRAIN_NEAR_OVERFLOW = 0.75
+# seconds the fill rate is counted over
+IR_DRAIN_RATE_WINDOW = 0.5
+# pulses per second assumed when fewer were counted, about one device
+# sending V1 frames back to back. Traffic starts without warning, so the
+# service interval is never longer than this rate allows.
+IR_DRAIN_MIN_RATE = 1000
+
+
+class IRPulseDrain(object):
+    # Moves pulses out of PulseIn into a larger ring buffer so a slow frame
+    # doesn't overflow the hardware buffer. Call service_if_due() between
+    # the slow steps of the main loop, it only drains once service_interval
+    # has passed. Pass the drain to Infrared in place of PulseIn, it has the
+    # same interface.
+    def __init__(
+        self,
+        ir_pulsein,
+        capacity=IR_DRAIN_BUFFER,
+        near_overflow=IR_DRAIN_NEAR_OVERFLOW,
+    ):
+        self._ir_pulsein = ir_pulsein
+        self._buffer = array.array("H", [0] * capacity)
+        self._start = 0
+        self._count = 0
+        self._threshold = max(1, int(ir_pulsein.maxlen * near_overflow))
+        self._last_service = time.monotonic()
+        # pulses per second arriving in PulseIn over the last whole window
+        self._fill_rate = 0
+        self._window_start = self._last_service
+        self._window_pulses = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._services = 0
+        self._near_overflows = 0
+        self._overflows = 0
+        self._high_water = 0
+
+    def snapshot(self):
+        return {
+            "services": self._services,
+            "near_overflows": self._near_overflows,
+            "overflows": self._overflows,
+            "high_water": self._high_water,
+            "fill_rate": self._fill_rate,
+            "pulsein_maxlen": self._ir_pulsein.maxlen,
+        }
+
+    @property
+    def fill_rate(self):
+        return self._fill_rate
+
+    @property
+    def near_overflows(self):
+        return self._near_overflows
+
+    @property
+    def service_interval(self):
+        # seconds the main loop can go without service() before PulseIn
+        # reaches the near overflow mark at the current fill rate
+        return self._threshold / max(self._fill_rate, IR_DRAIN_MIN_RATE)
+
+    def service_if_due(self):
+        if time.monotonic() - self._last_service < self.service_interval:
+            return 0
+        return self.service()
+
+    def _count_pulses(self, count, now):
+        self._window_pulses += count
+        window = now - self._window_start
+        if window >= IR_DRAIN_RATE_WINDOW:
+            self._fill_rate = self._window_pulses / window
+            self._window_start = now
+            self._window_pulses = 0
+
+    def service(self):
+        ir_pulsein = self._ir_pulsein
+        now = time.monotonic()
+        pending = len(ir_pulsein)
+        self._last_service = now
+        self._services += 1
+        self._count_pulses(pending, now)
+        if pending == 0:
+            return 0
+
+        if pending > self._high_water:
+            self._high_water = pending
+        if pending >= self._threshold:
+            # reported by the caller from near_overflows, printing here
+            # would slow down the drain when it is needed most
+            self._near_overflows += 1
+
+        buffer = self._buffer
+        capacity = len(buffer)
+        popleft = ir_pulsein.popleft
+        # only what was there on entry, pulses still arriving wait for the
+        # next service so this never spins on a busy channel
+        for _ in range(pending):
+            if self._count == capacity:
+                # like PulseIn, the oldest pulse is lost when full
+                self._start = (self._start + 1) % capacity
+                self._count -= 1
+                self._overflows += 1
+            buffer[(self._start + self._count) % capacity] = popleft()
+            self._count += 1
+        return pending
+
+    @property
+    def maxlen(self):
+        return len(self._buffer)
+
+    def __len__(self):
+        # pulses still in PulseIn count too, they are taken by popleft()
+        # once the ring buffer is empty
+        return self._count + len(self._ir_pulsein)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("index out of range")
+        if index >= self._count:
+            return self._ir_pulsein[index - self._count]
+        return self._buffer[(self._start + index) % len(self._buffer)]
+
+    def popleft(self):
+        if self._count == 0 and self.service() == 0:
+            raise IndexError("pop from empty PulseIn")
+        pulse = self._buffer[self._start]
+        self._start = (self._start + 1) % len(self._buffer)
+        self._count -= 1
+        return pulse
+
+    def pause(self):
+        self._ir_pulsein.pause()
+
+    def resume(self, trigger_duration=0):
+        if trigger_duration:
+            self._ir_pulsein.resume(trigger_duration)
+        else:
+            self._ir_pulsein.resume()
+
+    def clear(self):
+        self._ir_pulsein.clear()
+        self._start = 0
+        self._count = 0
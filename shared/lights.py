@@ -12,17 +12,29 @@ SPELL_COLORS = {
 
 class PixelEdge(object):
     def __init__(self, pixel_buf, indexes):
-        self.pixel_buf = pixel_buf
+        # pixel_buf can be a function returning the buffer, called the first
+        # time a pixel is drawn so the pixels aren't set up before then
+        if callable(pixel_buf):
+            self._get_pixel_buf = pixel_buf
+            self.pixel_buf = None
+        else:
+            self._get_pixel_buf = None
+            self.pixel_buf = pixel_buf
         self.indexes = list(indexes)
 
+    def _buffer(self):
+        if self.pixel_buf is None:
+            self.pixel_buf = self._get_pixel_buf()
+        return self.pixel_buf
+
     def __len__(self):
         return len(self.indexes)
 
     def __setitem__(self, index, val):
-        self.pixel_buf[self.indexes[index]] = val
+        self._buffer()[self.indexes[index]] = val
 
     def __getitem__(self, index):
-        return self.pixel_buf[self.indexes[index]]
+        return self._buffer()[self.indexes[index]]
 
 
 def draw_simple(pixels, color, power):
@@ -0,0 +1,194 @@
+import array
+import os
+import struct
+
+SIGNAL_LIBRARY_MAGIC = b"QSIG"
+# name length and pulse count in front of every entry
+_ENTRY_HEADER = "<BH"
+_ENTRY_HEADER_SIZE = struct.calcsize(_ENTRY_HEADER)
+# bytes of replaced entries kept in the file before it is compacted
+SIGNAL_LIBRARY_SLACK = 1024
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+    except OSError:
+        return False
+    return True
+
+
+class SignalLibrary(object):
+    # Named IR pulse trains kept in one binary file: the magic, then for each
+    # entry its header, name and pulses as native "H" durations. Only the
+    # index is read at startup. An entry is read from flash the first time it
+    # is loaded and the same memoryview is handed out after that, so sending
+    # it doesn't build a new array.
+    #
+    # Saving appends an entry and the last one with a name wins, so a reset
+    # while writing can only lose the entry being written. Replaced entries
+    # are dropped by copying the rest to a temporary file that then takes the
+    # library's place.
+    #
+    # Saving needs a writable filesystem, see storage.remount() in boot.py.
+    # When the file can't be written, saved and default entries are kept in
+    # RAM until the next reboot.
+    def __init__(self, path: str, defaults=None):
+        self._path = path
+        self._temp_path = path + ".tmp"
+        # name -> (file offset of the pulses, pulse count)
+        self._index = {}
+        self._loaded = {}
+        # end of the last whole entry, 0 when there is no library yet
+        self._end = 0
+        # bytes of entries replaced by a later one with the same name
+        self._garbage = 0
+
+        try:
+            self._recover()
+            if not self._read_index():
+                print("Signal library cut off, compacting: ", path)
+                self._compact()
+        except OSError as error:
+            print("Signal library not writable: ", path, error)
+
+        if defaults:
+            for name in defaults:
+                if name not in self:
+                    self.save(name, defaults[name])
+
+    def _recover(self):
+        # a compaction was interrupted. With the library still there the
+        # copy may be incomplete, without it the copy is whole.
+        if not _exists(self._temp_path):
+            return
+        if _exists(self._path):
+            os.remove(self._temp_path)
+        else:
+            os.rename(self._temp_path, self._path)
+
+    def _read_index(self):
+        # returns False when the file ends inside an entry
+        self._index = {}
+        self._end = 0
+        self._garbage = 0
+        try:
+            size = os.stat(self._path)[6]
+            file = open(self._path, "rb")
+        except OSError:
+            return True
+
+        with file:
+            if file.read(len(SIGNAL_LIBRARY_MAGIC)) != SIGNAL_LIBRARY_MAGIC:
+                print("Not a signal library: ", self._path)
+                return True
+            self._end = len(SIGNAL_LIBRARY_MAGIC)
+            while self._end < size:
+                header = file.read(_ENTRY_HEADER_SIZE)
+                if len(header) < _ENTRY_HEADER_SIZE:
+                    return False
+                name_length, count = struct.unpack(_ENTRY_HEADER, header)
+                name = file.read(name_length)
+                offset = file.tell()
+                if len(name) < name_length or offset + count * 2 > size:
+                    return False
+                self._add_entry(name.decode(), offset, count)
+                file.seek(self._end)
+        return True
+
+    def _add_entry(self, name, offset, count):
+        replaced = self._index.get(name)
+        if replaced is not None:
+            self._garbage += self._entry_size(name, replaced[1])
+        self._index[name] = (offset, count)
+        self._end = offset + count * 2
+
+    def _entry_size(self, name, count):
+        return _ENTRY_HEADER_SIZE + len(name.encode()) + count * 2
+
+    def __contains__(self, name: str):
+        return name in self._index or name in self._loaded
+
+    def names(self):
+        names = list(self._index)
+        for name in self._loaded:
+            if name not in self._index:
+                names.append(name)
+        return names
+
+    def load(self, name: str):
+        # returns None for unknown names
+        pulses = self._loaded.get(name)
+        if pulses is not None:
+            return pulses
+        entry = self._index.get(name)
+        if entry is None:
+            return None
+
+        offset, count = entry
+        buffer = array.array("H", [0] * count)
+        with open(self._path, "rb") as file:
+            file.seek(offset)
+            file.readinto(buffer)
+        pulses = memoryview(buffer)
+        self._loaded[name] = pulses
+        return pulses
+
+    def save(self, name: str, pulses):
+        # stores the pulses under the name, replacing an entry with the same
+        # name, and returns them as they will be loaded
+        encoded_name = name.encode()
+        if len(encoded_name) > 0xFF or len(pulses) > 0xFFFF:
+            raise RuntimeError("Signal too large to save: ", name)
+
+        buffer = array.array("H", pulses)
+        try:
+            self._append(encoded_name, buffer)
+            if self._garbage > SIGNAL_LIBRARY_SLACK:
+                self._compact()
+        except OSError as error:
+            print("Signal library not writable, keeping in RAM: ", name, error)
+
+        pulses = memoryview(buffer)
+        self._loaded[name] = pulses
+        return pulses
+
+    def _write_entry(self, file, encoded_name, buffer):
+        file.write(struct.pack(_ENTRY_HEADER, len(encoded_name), len(buffer)))
+        file.write(encoded_name)
+        file.write(buffer)
+
+    def _append(self, encoded_name, buffer):
+        new_file = self._end == 0
+        with open(self._path, "wb" if new_file else "ab") as file:
+            if new_file:
+                file.write(SIGNAL_LIBRARY_MAGIC)
+                self._end = len(SIGNAL_LIBRARY_MAGIC)
+            self._write_entry(file, encoded_name, buffer)
+        offset = self._end + _ENTRY_HEADER_SIZE + len(encoded_name)
+        self._add_entry(encoded_name.decode(), offset, len(buffer))
+
+    def _compact(self):
+        # copies the entries in the index through a small buffer, so none of
+        # them is loaded, then swaps the copy in
+        chunk = bytearray(64)
+        chunk_view = memoryview(chunk)
+        with open(self._path, "rb") as source:
+            with open(self._temp_path, "wb") as copy:
+                copy.write(SIGNAL_LIBRARY_MAGIC)
+                for name in self._index:
+                    offset, count = self._index[name]
+                    encoded_name = name.encode()
+                    copy.write(struct.pack(_ENTRY_HEADER, len(encoded_name), count))
+                    copy.write(encoded_name)
+                    source.seek(offset)
+                    remaining = count * 2
+                    while remaining > 0:
+                        read = source.readinto(chunk_view[: min(remaining, len(chunk))])
+                        if not read:
+                            raise OSError("Signal library shorter than its index")
+                        copy.write(chunk_view[:read])
+                        remaining -= read
+        os.remove(self._path)
+        os.rename(self._temp_path, self._path)
+        self._read_index()
@@ -4,40 +4,59 @@ import audiomixer
 
 class Sound(object):
     def __init__(self, audio_out, volume=0.5, voices=1):
+        # audio_out can be a function returning the AudioOut, called with the
+        # mixer created on the first play so neither is set up before then
         self._audio_out = audio_out
+        self._voices = voices
+        self._mixer = None
+        self._master_volume = volume
+
+    def _start(self):
+        if callable(self._audio_out):
+            self._audio_out = self._audio_out()
         self._mixer = audiomixer.Mixer(
-            voice_count=voices,
+            voice_count=self._voices,
             sample_rate=22050,
             channel_count=1,
             bits_per_sample=16,
             samples_signed=True,
         )
-        self._master_volume = volume
 
     def master_volume(self, level):
         self._master_volume = level
+        if self._mixer is None:
+            return
+
         for voice in self._mixer.voice:
             voice.level = level
 
     def play_file(self, filename, loop=False, voice=0):
         print("playing sound", filename, loop, voice)
+        if self._mixer is None:
+            self._start()
         wave_file = WaveFile(open("sounds/" + filename, "rb"))
         if not self._audio_out.playing:
             self._audio_out.play(self._mixer)
         self._mixer.play(wave_file, voice=voice, loop=loop)
 
     def off(self):
+        if self._mixer is None:
+            return
+
         for i in range(len(self._mixer.voice)):
             self._mixer.stop_voice(i)
 
     def update(self):
-        if self._audio_out is None:
+        if self._audio_out is None or self._mixer is None:
             return
 
         if not self._mixer.playing and self._audio_out.playing:
             self._audio_out.stop()
 
     def volume_acceleration(self, voice, acceleration):
+        if self._mixer is None:
+            return
+
         x, y, z = acceleration
         additional_volume = min(0.5, max(0, x * x + y * y + z * z - 1))
         # print("Additional volume: ", additional_volume)
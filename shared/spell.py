@@ -3,6 +3,9 @@ from event import SPELL_EVENT
 
 spell_ids = {1: "Light", 2: "Fire", 3: "Water", 4: "Earth", 5: "Wind"}
 
+# every spell is sent with the same 4 byte shape, so reuse one buffer
+_spell_data = bytearray(4)
+
 
 def id_for_spell(name):
     for spell_id, spell_name in spell_ids.items():
@@ -48,7 +51,11 @@ class Spell(object):
 
         print("Sending event: ", self.name, self.spell_id, power_byte, team)
 
-        data = bytes((SPELL_EVENT, self._spell_id, power_byte, team))
+        data = _spell_data
+        data[0] = SPELL_EVENT
+        data[1] = self._spell_id
+        data[2] = power_byte
+        data[3] = team
         out.send(data)
 
 
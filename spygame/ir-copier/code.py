@@ -5,16 +5,18 @@ Infrared Copier - Capture IR data to button A or B, then play it back in transmi
 Switch off - Receive - captures IR raw data and assign the pulses to button A or B (whichever is held down)
 Switch On - Transmit - transmits captured IR data when the A or B button is pressed
 - Button - transmit the last IR data 
+Captures are saved to the signal library so they survive a power cycle, this
+needs a boot.py that remounts the filesystem writable for CircuitPython
 """
 
 import pulseio
 import pwmio
 import board
-import array
 from digitalio import DigitalInOut, Direction, Pull
 from adafruit_irremote import GenericDecode
 
 from state import StateContext, State, StateMachine
+from signal_library import SignalLibrary
 
 # CONFIGURATION
 
@@ -23,6 +25,8 @@ LT_SOLO   = [3000, 6000, 3000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 1000, 2
 LT_TEAM_1 = [3000, 6000, 3000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 2000, 2000, 1000, 2000, 1000]
 LT_TEAM_2 = [3000, 6000, 3000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 2000, 2000, 1000, 2000, 1000, 2000, 1000]
 
+SIGNAL_LIBRARY_PATH = "/signals.bin"
+
 
 # HARDWARE INITIALIZATION
 switch = DigitalInOut(board.SLIDE_SWITCH)
@@ -43,6 +47,11 @@ ir_decoder = GenericDecode()
 pwm_out = pwmio.PWMOut(board.TX, frequency=38000, duty_cycle=2 ** 15)
 pulse_out = pulseio.PulseOut(pwm_out)
 
+signals = SignalLibrary(
+    SIGNAL_LIBRARY_PATH,
+    {"lt_solo": LT_SOLO, "lt_team_1": LT_TEAM_1, "lt_team_2": LT_TEAM_2},
+)
+
 
 # STATE MACHINE
 
@@ -50,9 +59,12 @@ class IRCopierContext(StateContext):
     def __init__(self):
         super().__init__()
 
-        # receiving pulses
-        self.button_a_pulses = None
-        self.button_b_pulses = None
+        # receiving pulses, the last captures are kept across reboots
+        self.button_a_pulses = signals.load("button_a")
+        self.button_b_pulses = signals.load("button_b")
+        # captured while the button is held, saved once it is released
+        self.button_a_unsaved = False
+        self.button_b_unsaved = False
 
 
 class States:
@@ -62,21 +74,33 @@ class States:
 
 class Receive(State):
     def update(self, context: IRCopierContext):
+        # every burst while a button is held replaces the capture, only the
+        # last one is written to flash
+        if context.button_a_unsaved and buttonA.value == 0:
+            context.button_a_pulses = signals.save("button_a", context.button_a_pulses)
+            context.button_a_unsaved = False
+            print("Saved Button A")
+        if context.button_b_unsaved and buttonB.value == 0:
+            context.button_b_pulses = signals.save("button_b", context.button_b_pulses)
+            context.button_b_unsaved = False
+            print("Saved Button B")
+
         if switch.value:
             return States.transmit
 
         pulses = ir_decoder.read_pulses(
             pulse_in, max_pulse=10000, blocking=False)
         if pulses:
-            pulseArray = array.array("H", pulses)
             print("Pulses received:")
-            print(pulseArray)
+            print(pulses)
 
             if buttonA.value == 1:
-                context.button_a_pulses = pulseArray
+                context.button_a_pulses = pulses
+                context.button_a_unsaved = True
                 print("Assigned to Button A")
             if buttonB.value == 1:
-                context.button_b_pulses = pulseArray
+                context.button_b_pulses = pulses
+                context.button_b_unsaved = True
                 print("Assigned to Button B")
 
         return self
@@ -92,8 +116,7 @@ class Transmit(State):
             return
 
         pulse_in.pause()
-        print("Sending pulses")
-        print(pulses)
+        print("Sending ", len(pulses), " pulses")
         pulse_out.send(pulses)
 
         pulse_in.resume()
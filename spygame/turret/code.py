@@ -9,7 +9,6 @@ Active - Shoot one or more times with random delays. Green LEDs indicate hit poi
 Neutralized - When hit points is reduced to 0, the turret is out of the game until the switch is toggled or power is cycled 
 """
 
-import array
 import random
 import pulseio
 import board
@@ -32,6 +31,8 @@ from state_of_things import Thing, State, ThingObserver
 
 # CONFIGURATION
 import config
+from hit_matcher import HitMatcher
+from signal_library import SignalLibrary
 
 # HARDWARE INITIALIZATION
 switch = DigitalInOut(board.SLIDE_SWITCH)
@@ -71,6 +72,25 @@ ir_decoder = GenericDecode()
 
 pulse_out = pulseio.PulseOut(board.TX, frequency=38000, duty_cycle=2 ** 15)
 
+# shot signatures are read from flash, config only seeds a missing library
+signals = SignalLibrary(
+    config.SIGNAL_LIBRARY_PATH,
+    {
+        "team_1": config.TEAM_1_SHOOT_PULSE,
+        "team_2": config.TEAM_2_SHOOT_PULSE,
+        "solo": config.SOLO_SHOOT_PULSE,
+    },
+)
+
+hit_matcher = HitMatcher(
+    [
+        (1, signals.load("team_1")),
+        (2, signals.load("team_2")),
+        (config.SOLO_TEAM, signals.load("solo")),
+    ],
+    tolerance=config.HIT_PULSE_TOLERANCE,
+)
+
 # ANIMATIONS
 configure_animation = Comet(
     pixels, speed=0.2, color=config.WHITE, tail_length=7, bounce=True)
@@ -101,8 +121,7 @@ class Turret(Thing):
     hit_points: int = 0
     team: int = 0
     team_color: int = 0
-    shoot_pulse: list = []
-    hit_pulse: list = []
+    shoot_pulse: memoryview = None
     
     def __init__(self):
         super().__init__(TurretStates.configure)
@@ -129,16 +148,13 @@ class Turret(Thing):
         self.team = team
         if self.team == 1:
             self.team_color = config.TEAM_1_COLOR
-            self.shoot_pulse = config.TEAM_1_SHOOT_PULSE
-            self.hit_pulse = config.TEAM_2_SHOOT_PULSE
+            self.shoot_pulse = signals.load("team_1")
         elif self.team == 2:
             self.team_color = config.TEAM_2_COLOR
-            self.shoot_pulse = config.TEAM_2_SHOOT_PULSE
-            self.hit_pulse = config.TEAM_1_SHOOT_PULSE
+            self.shoot_pulse = signals.load("team_2")
         else:
             self.team_color = config.WHITE
-            self.shoot_pulse = []
-            self.hit_pulse = []
+            self.shoot_pulse = None
 
 
 def configure_mode():
@@ -157,21 +173,21 @@ def randfloat(start, end):
     return (end - start) * random.random() + start
 
 
-def check_pulses(hit_pulse):
+def check_pulses(team):
     pulses = ir_decoder.read_pulses(pulse_in, max_pulse=10000, blocking=False)
     if pulses:
-        print("Pulses: ", pulses)
         if len(pulses) < 2:
             return None
 
-        if len(pulses) != len(hit_pulse):
+        # any other IR activity wakes the turret up, solo shots and other
+        # teams hit it
+        shooter_team = hit_matcher.match(pulses)
+        if shooter_team is None:
+            return TurretStates.active
+        if shooter_team != config.SOLO_TEAM and shooter_team == team:
             return TurretStates.active
 
-        for expected_pulse in hit_pulse:
-            pulse_delta = abs(expected_pulse - pulses.pop(0))
-            if pulse_delta > 150:
-                return TurretStates.active
-
+        print("Hit by team: ", shooter_team)
         return TurretStates.hit
 
     return None
@@ -296,7 +312,7 @@ class Sentry(State):
         if configure_mode():
             return TurretStates.configure
 
-        pulses_state = check_pulses(thing.hit_pulse)
+        pulses_state = check_pulses(thing.team)
         if pulses_state:
             return pulses_state
 
@@ -334,7 +350,7 @@ class Active(State):
             thing.shoot_delay = randfloat(
                 config.SHOOT_DELAY_MIN, config.SHOOT_DELAY_MAX)
 
-        pulses_state = check_pulses(thing.hit_pulse)
+        pulses_state = check_pulses(thing.team)
         if pulses_state:
             return pulses_state
 
@@ -392,13 +408,13 @@ class Shoot(State):
         pixels.fill(config.COLOR_SHOOTING)
         pixels.show()
 
-        pulse_in.pause()
-        pulses = array.array("H", thing.shoot_pulse)
-        print(pulses)
-        pulse_out.send(pulses)
+        if thing.shoot_pulse:
+            pulse_in.pause()
+            print("Sending ", len(thing.shoot_pulse), " pulses")
+            pulse_out.send(thing.shoot_pulse)
 
-        pulse_in.resume()
-        pulse_in.clear()
+            pulse_in.resume()
+            pulse_in.clear()
 
         play_sound("sounds\shoot.wav")
         while audio.playing:
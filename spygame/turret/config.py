@@ -23,6 +23,17 @@ TEAM_1_SHOOT_PULSE = [3000, 6000, 3000, 2000, 1000, 2000, 1000, 2000, 1000, 2000
 TEAM_2_COLOR = YELLOW
 TEAM_2_SHOOT_PULSE = [3000, 6000, 3000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 2000, 2000, 1000, 2000, 1000, 2000, 1000]
 
+# Solo shots hit every team, including a turret on no team (team 0)
+SOLO_TEAM = -1
+SOLO_SHOOT_PULSE = [3000, 6000, 3000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 1000, 2000, 1000]
+
+# Shot signatures above are written here the first time the turret starts,
+# edit or replace them on the board without changing this file
+SIGNAL_LIBRARY_PATH = "/signals.bin"
+
+# Allowed difference in microseconds between a received pulse and a shot signature
+HIT_PULSE_TOLERANCE = 150
+
 STARTING_TEAM=1
 
 # Difficulty
@@ -0,0 +1,49 @@
+import array
+
+
+class HitMatcher:
+    # Compiled once at startup from the known shot signatures. match() checks
+    # a received burst against every signature in a single pass and returns
+    # the team of the one that matched, or None.
+    def __init__(self, signatures, tolerance: int):
+        self._teams = []
+        self._offsets = array.array("H")
+        self._low = array.array("H")
+        self._high = array.array("H")
+        # signatures of the same length are checked together, as a bit mask
+        self._length_masks = {}
+
+        for team, pulses in signatures:
+            index = len(self._teams)
+            self._teams.append(team)
+            self._offsets.append(len(self._low))
+            for pulse in pulses:
+                self._low.append(max(pulse - tolerance, 0))
+                self._high.append(min(pulse + tolerance, 0xFFFF))
+            length = len(pulses)
+            mask = self._length_masks.get(length, 0)
+            self._length_masks[length] = mask | (1 << index)
+
+    def match(self, pulses):
+        candidates = self._length_masks.get(len(pulses), 0)
+        if candidates == 0:
+            return None
+
+        offsets = self._offsets
+        low = self._low
+        high = self._high
+        signature_count = len(self._teams)
+        for pulse_index in range(len(pulses)):
+            pulse = pulses[pulse_index]
+            for index in range(signature_count):
+                bit = 1 << index
+                if candidates & bit:
+                    bound = offsets[index] + pulse_index
+                    if pulse < low[bound] or pulse > high[bound]:
+                        candidates &= ~bit
+            if candidates == 0:
+                return None
+
+        for index in range(signature_count):
+            if candidates & (1 << index):
+                return self._teams[index]
@@ -4,18 +4,23 @@ from sound import Sound
 from spell import receive_spell
 from lights import SPELL_COLORS
 from infrared import Infrared
+from infrared_dedup import IRDuplicateFilter
 
 
-hw = Hardware()
+hw = Hardware(
+    {
+        "pixels": {"hit": {"data": board.NEOPIXEL, "count": 10, "brightness": 0.2}},
+        "audio": {"onboard": True},
+        # the target only receives, so there is no "ir_out". Infrared only
+        # asks for the PulseOut when a frame is queued, which never happens.
+        "ir_in": {"pin": board.D0},
+    }
+)
 
-hw.setup_neopixels("hit", data=board.NEOPIXEL, count=10, brightness=0.2)
+sound = Sound(lambda: hw.audio, voices=1, volume=0.2)
 
-hw.setup_onboard_audio()
-sound = Sound(hw.audio, voices=1, volume=0.2)
-
-hw.setup_ir_in(board.D0)
-hw.setup_ir_out(board.D1)
-infrared = Infrared(hw.ir_pulseout, hw.ir_pulsein)
+infrared = Infrared(lambda: hw.ir_pulseout, hw.ir_pulsein)
+ir_duplicates = IRDuplicateFilter()
 
 
 def draw_hit(spell, ir_strength):
@@ -31,15 +36,15 @@ def draw_hit(spell, ir_strength):
 while True:
     hw.update()
 
-    received = infrared.receive()
-    if received is not None:
-        data, strength = received
-        print("IR Data Received: ", data, strength)
+    for packet in infrared.receive_all():
+        if ir_duplicates.is_duplicate(packet):
+            continue
+        print("IR Data Received: ", bytes(packet.data), packet.strength)
 
-        spell_event = receive_spell(data)
+        spell_event = receive_spell(packet.data)
         if spell_event:
             spell, team = spell_event
-            draw_hit(spell, strength)
+            draw_hit(spell, packet.strength)
 
             sound.play_file("hit.wav", loop=False, voice=0)
 
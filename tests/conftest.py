@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the shared modules are imported by name on the devices, and the host
+# tools the same way
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "shared"))
+sys.path.insert(0, os.path.join(ROOT, "host"))
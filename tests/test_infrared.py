@@ -0,0 +1,149 @@
+import random
+
+import pytest
+
+import infrared
+
+
+def frame(payload, protocol=infrared.IR_PROTOCOL_V1, unit=infrared.IR_UNIT):
+    return list(infrared.IREncoder(protocol, unit).encode(payload))
+
+
+def decode_all(decoder, pulses):
+    packets = []
+    for pulse in pulses:
+        packet = decoder.decode(pulse)
+        if packet is not None:
+            packets.append(bytes(packet.data))
+    packet = decoder.recovered()
+    while packet is not None:
+        packets.append(bytes(packet.data))
+        packet = decoder.recovered()
+    return packets
+
+
+def hidden_frames():
+    # an FEC frame at a long unit cut off after its first byte takes two
+    # short frames as the rest of its data, until a pulse too long for any
+    # data symbol breaks it
+    cut_off = list(infrared.IREncoder(unit=700, fec=True).encode(b"\x00"))[:18]
+    first = frame(b"\x01", infrared.IR_PROTOCOL_V2, 300)
+    second = frame(b"\x02", infrared.IR_PROTOCOL_V2, 300)
+    return cut_off + first + second + [5000]
+
+
+def test_resync_returns_every_recovered_frame():
+    decoder = infrared.IRDecoder(lookback=48)
+    assert decode_all(decoder, hidden_frames()) == [b"\x01", b"\x02"]
+
+
+def test_decode_many_returns_every_recovered_frame():
+    decoder = infrared.IRDecoder(lookback=48)
+    packets = []
+    pulses = hidden_frames() + frame(b"\x03")
+    consumed = decoder.decode_many(pulses, packets)
+    assert consumed == len(pulses)
+    assert [bytes(packet.data) for packet in packets] == [b"\x01", b"\x02", b"\x03"]
+
+
+def test_decode_many_keeps_recovered_frames_past_the_limit():
+    decoder = infrared.IRDecoder(lookback=48)
+    packets = []
+    pulses = hidden_frames()
+    consumed = decoder.decode_many(pulses, packets, limit=1)
+    assert consumed == len(pulses)
+    assert decoder.decode_many([], packets, limit=1) == 0
+    assert [bytes(packet.data) for packet in packets] == [b"\x01", b"\x02"]
+
+
+def test_corrected_fec_frame_keeps_some_strength():
+    encoder = infrared.IREncoder(fec=True)
+    pulses = list(encoder.encode(b"\x5a"))
+    # a zero stretched past the error margin of every symbol
+    first_zero = pulses.index(infrared.IR_ZERO, 2)
+    pulses[first_zero] = infrared.IR_ZERO * 2 + 100
+    decoder = infrared.IRDecoder()
+    packets = [decoder.decode(pulse) for pulse in pulses]
+    packet = packets[-1]
+    assert bytes(packet.data) == b"\x5a"
+    assert packet.corrected == 1
+    assert packet.strength == infrared.IR_MIN_STRENGTH
+
+
+def test_clean_frame_has_full_strength():
+    decoder = infrared.IRDecoder()
+    packets = [decoder.decode(pulse) for pulse in frame(b"\x5a")]
+    assert packets[-1].strength == 1
+
+
+def test_slots_never_overlap():
+    teams = 4
+    players_per_team = 8
+    slots = set()
+    for team in range(teams):
+        for player_index in range(players_per_team):
+            slots.add(infrared.ir_slot(team, player_index, players_per_team))
+    assert slots == set(range(teams * players_per_team))
+
+
+def test_slot_player_index_out_of_range():
+    with pytest.raises(RuntimeError):
+        infrared.ir_slot(1, 4, 4)
+
+
+def test_noise_passing_for_an_fec_header_keeps_the_plain_frames():
+    # noise with the mark to space ratio of an FEC header in front of each
+    # plain frame. It is given up at the first byte, so the lookback finds
+    # the frame again.
+    payloads = [bytes([i]) * 6 for i in range(1, 4)]
+    pulses = []
+    for payload in payloads:
+        pulses += [5364, 7352] + frame(payload, infrared.IR_PROTOCOL_V2, 350)
+    decoder = infrared.IRDecoder(lookback=16)
+    assert decode_all(decoder, pulses) == payloads
+    assert decoder.snapshot()["false_fec_syncs"] == len(payloads)
+
+
+def test_jittered_frames_within_the_fixed_margins_decode():
+    # the decoder before the unit calibration took every frame whose pulses
+    # were all within the error margin of their durations at IR_UNIT, none
+    # of them may be lost to a unit measured from a jittered header
+    margin = infrared.IR_ERROR_MARGIN
+    rng = random.Random(7)
+    encoder = infrared.IREncoder()
+    decoder = infrared.IRDecoder(0)
+    within = 0
+    for i in range(1000):
+        payload = bytes(rng.randrange(256) for _ in range(4))
+        durations = list(encoder.encode(payload))
+        pulses = [int(duration + rng.gauss(0, 80)) for duration in durations]
+        if all(-margin <= pulse - d < margin for pulse, d in zip(pulses, durations)):
+            within += 1
+            assert decode_all(decoder, pulses) == [payload]
+    assert within > 500
+
+
+def test_pulseout_getter_is_called_on_the_first_send():
+    class PulseOut(object):
+        def __init__(self):
+            self.sent = []
+
+        def send(self, durations):
+            self.sent.append(list(durations))
+
+    pulseout = PulseOut()
+    calls = []
+
+    def get_pulseout():
+        calls.append(pulseout)
+        return pulseout
+
+    ir = infrared.Infrared(get_pulseout, [])
+    ir.tick()
+    assert calls == []
+    ir.send(b"\x5a")
+    ir.tick()
+    ir.send(b"\xa5")
+    ir.tick()
+    assert len(calls) == 1
+    assert pulseout.sent == [frame(b"\x5a"), frame(b"\xa5")]
@@ -0,0 +1,41 @@
+import io
+
+from infrared_capture import CaptureRecorder, CaptureReplay
+
+
+def record(bursts):
+    file = io.BytesIO()
+    recorder = CaptureRecorder(file)
+    for timestamp, pulses in bursts:
+        recorder.record(pulses, timestamp)
+    recorder.flush()
+    return file.getvalue()
+
+
+def replay_all(data):
+    replay = CaptureReplay(io.BytesIO(data))
+    return replay, [replay.popleft() for i in range(len(replay))]
+
+
+def test_round_trip():
+    data = record([(0, [900, 300, 600]), (12, [1500, 300])])
+    replay, pulses = replay_all(data)
+    assert pulses == [900, 300, 600, 1500, 300]
+    assert replay.bursts == 2
+    assert replay.done
+
+
+def test_truncated_on_odd_byte(capsys):
+    data = record([(0, [900, 300, 600]), (12, [1500, 300, 450])])
+    # cut off mid-way through the last pulse
+    replay, pulses = replay_all(data[:-1])
+    assert pulses == [900, 300, 600, 1500, 300]
+    assert replay.bursts == 2
+    assert "truncated" in capsys.readouterr().out
+
+
+def test_truncated_in_burst_header():
+    data = record([(0, [900, 300]), (12, [1500])])
+    replay, pulses = replay_all(data[:-5])
+    assert pulses == [900, 300]
+    assert replay.bursts == 1
@@ -0,0 +1,33 @@
+import infrared
+from infrared_dedup import IRDuplicateFilter
+
+
+def packet(payload):
+    decoder = infrared.IRDecoder()
+    for pulse in infrared.IREncoder().encode(payload):
+        found = decoder.decode(pulse)
+    return found
+
+
+def test_repeat_within_window_is_dropped():
+    duplicates = IRDuplicateFilter()
+    hit = packet(b"\x21\x02")
+    assert not duplicates.is_duplicate(hit, now=10.0)
+    assert duplicates.is_duplicate(hit, now=10.05)
+    assert not duplicates.is_duplicate(hit, now=10.2)
+
+
+def test_window_holds_after_days_of_uptime():
+    # float32 only has a resolution of 15ms at 3 days
+    duplicates = IRDuplicateFilter()
+    hit = packet(b"\x21\x02")
+    start = 3 * 24 * 3600 + 0.004
+    assert not duplicates.is_duplicate(hit, now=start)
+    assert duplicates.is_duplicate(hit, now=start + 0.1)
+    assert not duplicates.is_duplicate(hit, now=start + 0.102)
+
+
+def test_different_payloads_are_kept():
+    duplicates = IRDuplicateFilter()
+    assert not duplicates.is_duplicate(packet(b"\x21\x02"), now=1.0)
+    assert not duplicates.is_duplicate(packet(b"\x21\x03"), now=1.01)
@@ -0,0 +1,70 @@
+import infrared_drain
+from infrared_drain import IRPulseDrain, IR_DRAIN_MIN_RATE
+from ir_medium import FakePulseIn, SimClock
+
+
+def make_drain(monkeypatch, maxlen=100):
+    clock = SimClock()
+    monkeypatch.setattr(infrared_drain, "time", clock)
+    pulsein = FakePulseIn(maxlen)
+    return clock, pulsein, IRPulseDrain(pulsein)
+
+
+def arrive(pulsein, count):
+    for i in range(count):
+        pulsein._record(500 + i)
+
+
+def test_len_has_no_side_effects(monkeypatch):
+    clock, pulsein, drain = make_drain(monkeypatch)
+    arrive(pulsein, 10)
+    for i in range(5):
+        assert len(drain) == 10
+    assert len(pulsein) == 10
+    assert drain.snapshot()["services"] == 0
+    assert drain[0] == 500 and drain[9] == 509
+
+
+def test_pulses_come_out_in_order(monkeypatch):
+    clock, pulsein, drain = make_drain(monkeypatch)
+    arrive(pulsein, 3)
+    drain.service()
+    pulsein._record(900)
+    assert len(drain) == 4
+    assert drain[3] == 900
+    assert [drain.popleft() for i in range(4)] == [500, 501, 502, 900]
+    assert len(drain) == 0
+
+
+def test_fill_rate_is_measured_over_a_window(monkeypatch):
+    clock, pulsein, drain = make_drain(monkeypatch)
+    # many services close together must not bias the rate
+    for step in range(50):
+        arrive(pulsein, 20)
+        clock.sleep(0.01)
+        drain.service()
+        for i in range(10):
+            drain.service()
+    assert abs(drain.fill_rate - 2000) < 1
+    assert abs(drain.service_interval - 75 / 2000) < 0.001
+
+
+def test_quiet_channel_still_gets_serviced(monkeypatch):
+    clock, pulsein, drain = make_drain(monkeypatch)
+    clock.sleep(1)
+    drain.service()
+    assert drain.fill_rate == 0
+    assert drain.service_interval == 75 / IR_DRAIN_MIN_RATE
+
+    arrive(pulsein, 5)
+    assert drain.service_if_due() == 0
+    clock.sleep(drain.service_interval + 0.001)
+    assert drain.service_if_due() == 5
+
+
+def test_near_overflows_are_counted(monkeypatch, capsys):
+    clock, pulsein, drain = make_drain(monkeypatch)
+    arrive(pulsein, 80)
+    drain.service()
+    assert drain.near_overflows == 1
+    assert capsys.readouterr().out == ""
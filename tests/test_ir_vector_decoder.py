@@ -0,0 +1,24 @@
+import ir_vector_decoder
+
+
+def test_matches_the_scalar_decoder_without_noise():
+    pulses = ir_vector_decoder.generate(2000, seed=3, noise=False)
+    vector = ir_vector_decoder.decode(pulses)
+    assert len(vector) > 1900
+    found = [(payload, strength) for position, payload, strength in vector]
+    assert found == ir_vector_decoder.scalar_decode(pulses)
+
+
+def test_finds_every_scalar_frame_with_noise():
+    # frames that overlap an earlier one are kept, noise can pass a CRC in
+    # a frame IRDecoder never started and hide the real one behind it
+    pulses = ir_vector_decoder.generate(2000, seed=3)
+    candidates = iter(
+        (payload, strength)
+        for position, payload, strength in ir_vector_decoder.decode(pulses, True)
+    )
+    scalar = ir_vector_decoder.scalar_decode(pulses)
+    assert scalar
+    for packet in scalar:
+        assert packet in candidates
+    assert len(ir_vector_decoder.decode(pulses)) >= len(scalar)
@@ -0,0 +1,78 @@
+import os
+
+import signal_library
+from signal_library import SignalLibrary
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "signals.bin")
+    library = SignalLibrary(path, {"solo": [3000, 6000, 3000]})
+    library.save("team_1", [1000, 2000])
+
+    reopened = SignalLibrary(path)
+    assert sorted(reopened.names()) == ["solo", "team_1"]
+    assert list(reopened.load("solo")) == [3000, 6000, 3000]
+    assert list(reopened.load("team_1")) == [1000, 2000]
+    assert reopened.load("missing") is None
+
+
+def test_last_save_wins(tmp_path):
+    path = str(tmp_path / "signals.bin")
+    library = SignalLibrary(path)
+    library.save("button_a", [1, 2, 3])
+    library.save("button_b", [4])
+    library.save("button_a", [5, 6])
+
+    reopened = SignalLibrary(path)
+    assert list(reopened.load("button_a")) == [5, 6]
+    assert list(reopened.load("button_b")) == [4]
+
+
+def test_entry_cut_off_while_writing(tmp_path):
+    path = str(tmp_path / "signals.bin")
+    library = SignalLibrary(path)
+    library.save("button_a", [1, 2, 3])
+    library.save("button_b", [4, 5, 6])
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(data[:-3])
+
+    reopened = SignalLibrary(path)
+    assert reopened.names() == ["button_a"]
+    assert list(reopened.load("button_a")) == [1, 2, 3]
+    # the partial entry is gone, so later saves aren't hidden behind it
+    reopened.save("button_b", [7])
+    assert list(SignalLibrary(path).load("button_b")) == [7]
+
+
+def test_compaction_keeps_entries_unloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(signal_library, "SIGNAL_LIBRARY_SLACK", 100)
+    path = str(tmp_path / "signals.bin")
+    library = SignalLibrary(path)
+    library.save("keep", list(range(40)))
+    library = SignalLibrary(path)
+    for i in range(10):
+        library.save("capture", [i] * 20)
+
+    # magic, both entries and at most the slack of replaced ones
+    assert os.path.getsize(path) <= 4 + (3 + 4 + 80) + (3 + 7 + 40) + 100
+    assert "keep" not in library._loaded
+    assert not os.path.exists(path + ".tmp")
+    reopened = SignalLibrary(path)
+    assert list(reopened.load("keep")) == list(range(40))
+    assert list(reopened.load("capture")) == [9] * 20
+
+
+def test_interrupted_compaction(tmp_path):
+    path = str(tmp_path / "signals.bin")
+    SignalLibrary(path).save("button_a", [1, 2])
+    # the copy was written and the old library removed, the rename is left
+    os.rename(path, path + ".tmp")
+    assert list(SignalLibrary(path).load("button_a")) == [1, 2]
+
+    # the copy was cut off while the old library was still there
+    with open(path + ".tmp", "wb") as file:
+        file.write(b"QSIG\x08")
+    assert list(SignalLibrary(path).load("button_a")) == [1, 2]
+    assert not os.path.exists(path + ".tmp")
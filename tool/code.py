@@ -1,15 +1,31 @@
 import board
-import time
 import random
 import math
 from digitalio import Pull
-from hardware import Hardware
-from sound import Sound
-from state import State, StateMachine
-from spell import select_spell, receive_spell
-from lights import draw_casting, draw_spell, draw_weaved, PixelEdge, draw_hitpoints
-from infrared import Infrared
-from player import Player
+from boot_profiler import BootProfiler
+
+# set to print the time and heap every import and hardware setup takes
+PROFILE_BOOT = False
+profiler = BootProfiler(PROFILE_BOOT)
+
+with profiler.step("import hardware"):
+    from hardware import Hardware
+with profiler.step("import sound"):
+    from sound import Sound
+with profiler.step("import state"):
+    from state import State, StateMachine
+with profiler.step("import spell"):
+    from spell import select_spell, receive_spell
+with profiler.step("import lights"):
+    from lights import draw_casting, draw_spell, draw_weaved, PixelEdge, draw_hitpoints
+with profiler.step("import infrared"):
+    from infrared import Infrared, ir_slot
+with profiler.step("import infrared_drain"):
+    from infrared_drain import IRPulseDrain
+with profiler.step("import infrared_dedup"):
+    from infrared_dedup import IRDuplicateFilter
+with profiler.step("import player"):
+    from player import Player
 
 
 # Spell States
@@ -30,26 +46,45 @@ from player import Player
 # Weaved (a spell was weaved, activate it)
 # - if done activating -> Idle
 
-hw = Hardware()
-hw.setup_onboard_lis3dh()
-
-hw.setup_dotstars("blade", clock=board.A3, data=board.A1, count=14, brightness=0.2)
-left_edge = PixelEdge(hw.pixels["blade"], range(0, 7))
-right_edge = PixelEdge(hw.pixels["blade"], range(13, 7, -1))
-
-hw.setup_neopixels("health", data=board.NEOPIXEL, count=10, brightness=0.2)
-
-hw.setup_onboard_audio()
-sound = Sound(hw.audio, voices=2)
-
-hw.setup_ir_in(board.D0)
-hw.setup_ir_out(board.D1)
-infrared = Infrared(hw.ir_pulseout, hw.ir_pulsein)
-
-hw.setup_button("trigger", board.A2, Pull.UP)
-hw.setup_button("A", board.BUTTON_A, Pull.DOWN)
-hw.setup_button("B", board.BUTTON_B, Pull.DOWN)
-hw.setup_switch("switch", board.SLIDE_SWITCH, Pull.UP)
+hw = Hardware(
+    {
+        "lis3dh": {"onboard": True},
+        "pixels": {
+            "blade": {
+                "type": "dotstar",
+                "clock": board.A3,
+                "data": board.A1,
+                "count": 14,
+                "brightness": 0.2,
+            },
+            "health": {"data": board.NEOPIXEL, "count": 10, "brightness": 0.2},
+        },
+        "audio": {"onboard": True},
+        "ir_in": {"pin": board.D0},
+        "ir_out": {"pin": board.D1},
+        "buttons": {
+            "trigger": {"pin": board.A2, "pull": Pull.UP},
+            "A": {"pin": board.BUTTON_A, "pull": Pull.DOWN},
+            "B": {"pin": board.BUTTON_B, "pull": Pull.DOWN},
+        },
+        "switches": {"switch": {"pin": board.SLIDE_SWITCH, "pull": Pull.UP}},
+    },
+    profiler=profiler,
+)
+
+# the pixels, audio and IR output are set up when first drawn, played or
+# sent on, not while the program loads
+left_edge = PixelEdge(lambda: hw.pixels["blade"], range(0, 7))
+right_edge = PixelEdge(lambda: hw.pixels["blade"], range(13, 7, -1))
+
+sound = Sound(lambda: hw.audio, voices=2)
+
+ir_drain = IRPulseDrain(hw.ir_pulsein)
+infrared = Infrared(lambda: hw.ir_pulseout, ir_drain)
+ir_duplicates = IRDuplicateFilter()
+
+TRIGGER = hw.input_bit("trigger")
+BUTTON_A = hw.input_bit("A")
 
 
 # == Global Functions ==
@@ -63,7 +98,21 @@ def diff_iterable(it1, it2):
 
 
 # == States ==
-player = Player(team=math.floor(random.uniform(2, 32)))
+# set IR_TEAMS to hold each device's shots for its own time slot, crowded
+# games lose fewer frames to collisions. Every device then needs its own
+# IR_TEAM, from 0 to IR_TEAMS - 1, and IR_PLAYER_INDEX within the team.
+IR_TEAMS = 0
+IR_PLAYERS_PER_TEAM = 4
+IR_TEAM = 0
+IR_PLAYER_INDEX = 0
+if IR_TEAMS > 0:
+    player = Player(team=IR_TEAM)
+    infrared.use_slots(
+        ir_slot(IR_TEAM, IR_PLAYER_INDEX, IR_PLAYERS_PER_TEAM),
+        IR_TEAMS * IR_PLAYERS_PER_TEAM,
+    )
+else:
+    player = Player(team=math.floor(random.uniform(2, 32)))
 
 
 class GlobalState:
@@ -72,6 +121,8 @@ class GlobalState:
     casting_progress = 0
     weaved_spell = None
     weaved_progress = 0
+    test_send_delay = 0
+    ir_near_overflows = 0
 
 
 gs = GlobalState()
@@ -81,7 +132,7 @@ state_machine = StateMachine()
 
 class Idle(State):
     def update(self, ellapsed_time):
-        if hw.button_down("trigger"):
+        if hw.inputs & TRIGGER:
             return "Triggered"
         return self.name
 
@@ -94,15 +145,18 @@ class Triggered(State):
         State.enter(self)
         self.time_remaining = 0.5
 
-        gs.initial_acceleration = hw.current_acceleration
+        # the samples since the last FIFO read, the hardware reuses its
+        # Acceleration so keep the values
+        hw.read_acceleration()
+        gs.initial_acceleration = list(hw.current_acceleration)
 
     def update(self, ellapsed_time):
-        if (not hw.button_down("trigger")) and (len(player.active_spells) > 0):
+        if (not hw.inputs & TRIGGER) and (len(player.active_spells) > 0):
             return "Casting"
 
         self.time_remaining -= ellapsed_time
         if self.time_remaining <= 0:
-            if hw.button_down("trigger"):
+            if hw.inputs & TRIGGER:
                 return "Weaving"
             else:
                 return "Idle"
@@ -146,24 +200,28 @@ class Weaving(State):
 
         print_xyz("Weaving Enter Initial", gs.initial_acceleration)
         self.ellapsed_total = 0
-        self.min_acceleration = gs.initial_acceleration.copy()
-        self.max_acceleration = gs.initial_acceleration.copy()
+        # the motion is read back from the acceleration history when the
+        # trigger is released, a weave longer than the history only counts
+        # its end
+        self.start_time = hw.acceleration_history.latest_time or 0.0
 
     def update(self, ellapsed_time):
         self.ellapsed_total += ellapsed_time
 
         # print_xyz("Current acceleration", gs.current_acceleration)
 
-        self.min_acceleration = list(
-            map(min, hw.current_acceleration, self.min_acceleration)
-        )
-        self.max_acceleration = list(
-            map(max, hw.current_acceleration, self.max_acceleration)
-        )
-        # print_xyz("Min", self.min_acceleration)
-        # print_xyz("Max", self.max_acceleration)
-
-        if not hw.button_down("trigger"):
+        if not hw.inputs & TRIGGER:
+            # the history and current acceleration up to the release
+            hw.read_acceleration()
+            history = hw.acceleration_history
+            self.min_acceleration = [
+                min(initial, history.min(axis, self.start_time, initial))
+                for axis, initial in enumerate(gs.initial_acceleration)
+            ]
+            self.max_acceleration = [
+                max(initial, history.max(axis, self.start_time, initial))
+                for axis, initial in enumerate(gs.initial_acceleration)
+            ]
             print("Trigger Up!")
             print_xyz("Initial", gs.initial_acceleration)
             print_xyz("Min", self.min_acceleration)
@@ -210,26 +268,38 @@ state_machine.add_state(Weaved())
 
 state_machine.go_to_state("Idle")
 
+if PROFILE_BOOT:
+    # the accelerometer is set up by the first update
+    hw.update()
+    profiler.report()
+
 while True:
     hw.update()
 
     ellapsed_time = hw.ellapsed_time
 
     state_machine.update(ellapsed_time)
+    # state changes can block on sound files, the drain empties PulseIn
+    # between the slow steps whenever its service interval has passed
+    ir_drain.service_if_due()
 
     spell_was_active = len(player.active_spells)
 
     player.update(ellapsed_time)
+    ir_drain.service_if_due()
 
     if gs.casting_spell:
         draw_casting(gs.casting_spell, left_edge, ellapsed_time, gs.casting_progress)
+        ir_drain.service_if_due()
         draw_casting(gs.casting_spell, right_edge, ellapsed_time, gs.casting_progress)
     elif gs.weaved_spell:
         draw_weaved(gs.weaved_spell, left_edge, ellapsed_time, gs.weaved_progress)
+        ir_drain.service_if_due()
         draw_weaved(gs.weaved_spell, right_edge, ellapsed_time, gs.weaved_progress)
     elif len(player.active_spells) > 0:
         active_spell = player.active_spells[0]
         draw_spell(active_spell, left_edge, ellapsed_time)
+        ir_drain.service_if_due()
         draw_spell(active_spell, right_edge, ellapsed_time)
     else:
         if spell_was_active:
@@ -237,26 +307,35 @@ while True:
         hw.pixels["blade"].fill((0, 0, 0))
 
     hw.pixels["blade"].show()
+    ir_drain.service_if_due()
 
     if hw.pixels["health"]:
         draw_hitpoints(hw.pixels["health"], player.hitpoints, player.max_hitpoints)
         hw.pixels["health"].show()
+        ir_drain.service_if_due()
+
+    gs.test_send_delay = max(gs.test_send_delay - ellapsed_time, 0)
+    if hw.inputs & BUTTON_A and gs.test_send_delay == 0:
+        infrared.send(bytes((0b11111111, 0b01010101, 0b11001100, 0b00000000)))
+        gs.test_send_delay = 0.5
 
-    if hw.button_down("A"):
-        infrared.send([0b11111111, 0b01010101, 0b11001100, 0b00000000])
-        time.sleep(0.5)
+    infrared.tick()
 
-    received = infrared.receive()
-    if received is not None:
-        data, margin = received
-        print("IR Data Received: ", data, margin)
+    for packet in infrared.receive_all():
+        if ir_duplicates.is_duplicate(packet):
+            continue
+        print("IR Data Received: ", bytes(packet.data), packet.strength)
 
-        spell_event = receive_spell(data)
+        spell_event = receive_spell(packet.data)
         if spell_event:
             spell, team = spell_event
             player.hit_by_spell(spell, team)
             sound.play_file("swing.wav", loop=False, voice=1)
         # add other receivers that'll handle different events
 
+    if ir_drain.near_overflows != gs.ir_near_overflows:
+        gs.ir_near_overflows = ir_drain.near_overflows
+        print("IR PulseIn near overflows: ", gs.ir_near_overflows, ir_drain.snapshot())
+
     sound.update()
     sound.volume_acceleration(0, hw.current_acceleration)
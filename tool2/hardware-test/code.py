@@ -18,8 +18,8 @@ class StateChangeObserver(ThingObserver):
 infrared = Infrared(hardware.ir_pulseout, hardware.ir_pulsein, logging=True)
 
 class InfraredLogger(InfraredObserver):
-    def on_receive(self, data: bytearray, strength: float):
-        print(f"IR Data Received: {data.decode("utf-8")}, {strength}")
+    def on_receive(self, data: memoryview, strength: float):
+        print(f"IR Data Received: {bytes(data).decode("utf-8")}, {strength}")
         
 infrared_observers = InfraredObservers(infrared)
 infrared_observers.observers.attach(InfraredLogger())
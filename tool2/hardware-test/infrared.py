@@ -13,16 +13,33 @@ IR_LEAD_OUT = IR_UNIT * 10
 
 IR_CRC_GENERATOR = 0x1D
 
+# decoded packets are handed out from a ring of reused buffers, a packet is
+# valid until this many more have been received
+IR_PACKET_BUFFERS = 8
+IR_MAX_PAYLOAD = 16
 
-def _calculate_crc(data):
-    crc = 0
-    for data_byte in data:
-        crc ^= data_byte
+
+def _build_crc_table():
+    table = bytearray(256)
+    for value in range(256):
+        crc = value
         for j in range(8):
             if crc & 0x80 != 0:
                 crc = ((crc << 1) & 0xFF) ^ IR_CRC_GENERATOR
             else:
                 crc = (crc << 1) & 0xFF
+        table[value] = crc
+    return table
+
+
+# CRC-8 of every possible byte, so each data byte costs one lookup
+_CRC_TABLE = _build_crc_table()
+
+
+def _calculate_crc(data, crc=0):
+    crc_table = _CRC_TABLE
+    for data_byte in data:
+        crc = crc_table[crc ^ data_byte]
     return crc
 
 
@@ -91,9 +108,35 @@ class Infrared(object):
             duration_index += 1
 
 
+class IRPacket(object):
+    # A decoded frame. data is a memoryview into a buffer the decoder reuses,
+    # copy it with bytes(packet.data) to keep it past IR_PACKET_BUFFERS more
+    # packets.
+    def __init__(self):
+        self._buffer = bytearray(IR_MAX_PAYLOAD + 1)
+        self._view = memoryview(self._buffer)
+        # views of every payload length, created once when first needed
+        self._data_views = [None] * len(self._buffer)
+        self.data = self._view[:0]
+        self.crc = 0
+        self.strength = 0
+
+    def _set(self, length, strength):
+        data = self._data_views[length]
+        if data is None:
+            data = self._view[:length]
+            self._data_views[length] = data
+        self.data = data
+        self.crc = self._buffer[length]
+        self.strength = strength
+
+
 class IRDecoder(object):
     def __init__(self, logging=False):
         self.logging = logging
+        self._packet_ring = [IRPacket() for i in range(IR_PACKET_BUFFERS)]
+        self._packet_index = 0
+        self._received_buffer = self._packet_ring[0]._buffer
         self._reset_decode()
 
     def decode(self, pulse):
@@ -116,16 +159,25 @@ class IRDecoder(object):
             elif self._check_pulse(pulse, IR_ZERO):
                 self._write_bit(0)
             elif self._check_pulse(pulse, IR_LEAD_OUT):
-                received_crc = self._received_data[-1]
-                received_data = self._received_data[: len(
-                    self._received_data) - 1]
-                calculated_crc = _calculate_crc(received_data)
+                length = self._received_length
+                if length == 0 or length > len(self._received_buffer):
+                    # lead out without a CRC byte or too long, packet is corrupt
+                    self._reset_decode()
+                    return
+                received_crc = self._received_buffer[length - 1]
+                calculated_crc = self._data_crc
                 pulse_error_margin = self._max_error_margin
                 self._reset_decode()
                 if received_crc == calculated_crc:
                     error_ratio = pulse_error_margin / IR_ERROR_MARGIN
                     signal_strength = min(1, 1.3 - error_ratio)
-                    return received_data, signal_strength
+                    packet = self._packet_ring[self._packet_index]
+                    packet._set(length - 1, signal_strength)
+                    self._packet_index = (
+                        self._packet_index + 1) % IR_PACKET_BUFFERS
+                    self._received_buffer = self._packet_ring[
+                        self._packet_index]._buffer
+                    return packet
                 elif self.logging:
                     print("CRC mismatch: ", bin(
                         received_crc), bin(calculated_crc))
@@ -138,10 +190,13 @@ class IRDecoder(object):
     def _reset_decode(self):
         self._received_headers = 0
         self._max_error_margin = 0
-        self._received_data = None
+        self._received_length = 0
 
     def _reset_data(self):
-        self._received_data = bytearray()
+        self._received_length = 0
+        # running CRC of all received bytes, and of all but the last one
+        self._crc = 0
+        self._data_crc = 0
         self._reset_bits()
 
     def _reset_bits(self):
@@ -161,6 +216,10 @@ class IRDecoder(object):
         self._received_bit_index -= 1
         if self._received_bit_index < 0:
             # print("Received Byte: ", bin(self._received_byte))
-            self._received_data.append(self._received_byte)
+            if self._received_length < len(self._received_buffer):
+                self._received_buffer[self._received_length] = self._received_byte
+            self._received_length += 1
+            self._data_crc = self._crc
+            self._crc = _CRC_TABLE[self._crc ^ self._received_byte]
             self._reset_bits()
         # print("Bit Update: ", bin(self._received_byte), self._received_bit_index)
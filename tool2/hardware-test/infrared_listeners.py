@@ -13,7 +13,6 @@ class InfraredListeners(object):
         return self._on_receive
 
     def update(self) -> None:
-        received = self._infrared.receive()
-        if received is not None:
-            data, strength = received
-            self._on_receive.notify((data, strength))
+        packet = self._infrared.receive()
+        if packet is not None:
+            self._on_receive.notify((packet.data, packet.strength))
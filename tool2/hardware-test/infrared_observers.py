@@ -2,7 +2,7 @@ from state_of_things.observers import Observers
 from infrared import Infrared
 
 class InfraredObserver(object):
-    def on_receive(self, data: bytearray, strength: float):
+    def on_receive(self, data: memoryview, strength: float):
         pass
 
 class InfraredObservers(object):
@@ -16,7 +16,6 @@ class InfraredObservers(object):
         return self._observers
 
     def update(self) -> None:
-        received = self._infrared.receive()
-        if received is not None:
-            data, strength = received
-            self._observers.notify("on_receive", data, strength)
+        packet = self._infrared.receive()
+        if packet is not None:
+            self._observers.notify("on_receive", packet.data, packet.strength)